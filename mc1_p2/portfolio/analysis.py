@@ -32,6 +32,38 @@ def get_portfolio_value(prices, allocs, start_val=1):
     return port_val
 
 
+def get_normed_prices(prices):
+    """Normalize daily prices to their first day, once for many valuations.
+
+    Parameters
+    ----------
+        prices: daily prices for each stock in portfolio
+
+    Returns
+    -------
+        normed: days x stocks array of prices relative to the first day
+    """
+    values = np.asarray(prices, dtype=np.float64)
+    return values / values[0]
+
+
+def get_portfolio_value_batch(normed, allocs, start_val=1):
+    """Compute daily values of many portfolios sharing normalized prices.
+
+    Parameters
+    ----------
+        normed: days x stocks normalized prices (see get_normed_prices)
+        allocs: portfolios x stocks initial allocations, or one allocation vector
+        start_val: total starting value invested in each portfolio (default: 1)
+
+    Returns
+    -------
+        port_vals: days x portfolios array of daily portfolio values
+    """
+    allocs = np.atleast_2d(np.asarray(allocs, dtype=np.float64))
+    return normed.dot(allocs.T) * start_val
+
+
 def get_portfolio_stats(port_val, daily_rf=0, samples_per_year=252):
     """Calculate statistics on given portfolio values.
 
@@ -60,6 +92,33 @@ def get_portfolio_stats(port_val, daily_rf=0, samples_per_year=252):
     return cum_ret, avg_daily_ret, std_daily_ret, sharpe_ratio
 
 
+def get_portfolio_stats_batch(port_vals, daily_rf=0, samples_per_year=252):
+    """Calculate statistics on many portfolio value paths at once.
+
+    Parameters
+    ----------
+        port_vals: days x portfolios array of daily portfolio values
+        daily_rf: daily risk-free rate of return (default: 0%)
+        samples_per_year: frequency of sampling (default: 252 trading days)
+
+    Returns
+    -------
+        cum_ret: cumulative return of each portfolio
+        avg_daily_ret: average of daily returns of each portfolio
+        std_daily_ret: standard deviation of daily returns of each portfolio
+        sharpe_ratio: annualized Sharpe ratio of each portfolio
+    """
+    port_vals = np.asarray(port_vals, dtype=np.float64)
+    cum_ret = (port_vals[-1] / port_vals[0]) - 1
+
+    daily_ret = (port_vals[1:] / port_vals[:-1]) - 1
+
+    avg_daily_ret = daily_ret.mean(axis=0)
+    std_daily_ret = daily_ret.std(axis=0, ddof=1)
+    sharpe_ratio = np.sqrt(samples_per_year) * (avg_daily_ret - daily_rf) / std_daily_ret
+    return cum_ret, avg_daily_ret, std_daily_ret, sharpe_ratio
+
+
 def plot_normalized_data(df, title="Normalized prices", xlabel="Date", ylabel="Normalized price"):
     """Normalize given stock prices and plot for comparison.
 
@@ -3,42 +3,394 @@
 import pandas as pd
 import numpy as np
 import scipy.optimize as spo
+from collections import namedtuple
+from multiprocessing import Pool
 
 from util import get_data, plot_data
-from analysis import get_portfolio_value, get_portfolio_stats
+from analysis import get_portfolio_value, get_portfolio_stats, get_normed_prices
 
+MultiStartResult = namedtuple('MultiStartResult', ['allocs', 'sharpe_ratio', 'solutions',
+                                                   'sharpe_ratios', 'hits', 'converged', 'starts'])
 
-def find_optimal_allocations(prices):
+# Sharpe objective of a multi-start worker process, shared by all of its starts
+_worker_fun = None
+
+
+def get_sharpe_objective(normed, daily_rf=0, samples_per_year=252):
+    """Build the negative Sharpe ratio objective and its exact gradient.
+
+    Parameters
+    ----------
+        normed: days x stocks normalized prices (see get_normed_prices)
+        daily_rf: daily risk-free rate of return (default: 0%)
+        samples_per_year: frequency of sampling (default: 252 trading days)
+
+    Returns
+    -------
+        fun: function of allocations returning (-sharpe_ratio, gradient)
+    """
+    scale = np.sqrt(samples_per_year)
+    n_rets = len(normed) - 1
+    prev, curr = normed[:-1], normed[1:]
+
+    def fun(allocs):
+        '''Negative Sharpe ratio of allocs and its gradient'''
+        port_val = normed.dot(allocs)
+        growth = port_val[1:] / port_val[:-1]
+        daily_ret = growth - 1
+        avg_daily_ret = daily_ret.mean()
+        dev = daily_ret - avg_daily_ret
+        std_daily_ret = np.sqrt(dev.dot(dev) / (n_rets - 1))
+        sharpe_ratio = scale * (avg_daily_ret - daily_rf) / std_daily_ret
+
+        # d(daily_ret)/d(allocs), one row per day
+        d_ret = (curr - growth[:, np.newaxis] * prev) / port_val[:-1, np.newaxis]
+        d_avg = d_ret.mean(axis=0)
+        d_std = dev.dot(d_ret) / ((n_rets - 1) * std_daily_ret)
+        d_sharpe = scale * (d_avg * std_daily_ret - (avg_daily_ret - daily_rf) * d_std) / std_daily_ret ** 2
+        return -sharpe_ratio, -d_sharpe
+
+    return fun
+
+
+def find_optimal_allocations(prices, daily_rf=0, samples_per_year=252, allocs_guess=None, disp=True):
     """Find optimal allocations for a stock portfolio, optimizing for Sharpe ratio.
 
     Parameters
     ----------
         prices: daily prices for each stock in portfolio
+        daily_rf: daily risk-free rate of return (default: 0%)
+        samples_per_year: frequency of sampling (default: 252 trading days)
+        allocs_guess: starting allocations (default: equal weights)
+        disp: print solver convergence messages (default: True)
 
     Returns
     -------
         allocs: optimal allocations, as fractions that sum to 1.0
     """
+    normed = get_normed_prices(prices)
+    n_stocks = normed.shape[1]
+    fun = get_sharpe_objective(normed, daily_rf, samples_per_year)
 
-    # TODO: Your code here
-
-    def fun(allocs):
-        '''Optimization function'''
-        # Get daily portfolio value
-        port_val = get_portfolio_value(prices, allocs)
-        # Get portfolio statistics (note: std_daily_ret = volatility)
-        cum_ret, avg_daily_ret, std_daily_ret, sharpe_ratio = get_portfolio_stats(port_val)
-        return -sharpe_ratio
-
-    Xguess = [0.25, 0.25, 0.25, 0.25]
-    bnds = [(0.0, 1.0)] * 4
-    cons = ({'type': 'eq', 'fun': lambda inputs: 1.0 - np.sum(inputs)})
-    min_result = spo.minimize(fun, Xguess, method='SLSQP',
-                              bounds=bnds, constraints=cons, options={'disp': True})
+    if allocs_guess is None:
+        allocs_guess = np.ones(n_stocks) / n_stocks
+    min_result = _maximize_sharpe(fun, allocs_guess, disp)
     allocs = min_result.x
     return allocs
 
 
+def _maximize_sharpe(fun, allocs_guess, disp=False):
+    '''Run SLSQP on a Sharpe objective from get_sharpe_objective'''
+    n_stocks = len(allocs_guess)
+    bnds = [(0.0, 1.0)] * n_stocks
+    cons = ({'type': 'eq', 'fun': lambda inputs: 1.0 - np.sum(inputs),
+             'jac': lambda inputs: -np.ones_like(inputs)})
+    # SLSQP tends to need about one iteration per active asset
+    options = {'disp': disp, 'maxiter': max(100, 2 * n_stocks)}
+    return spo.minimize(fun, allocs_guess, method='SLSQP', jac=True,
+                        bounds=bnds, constraints=cons, options=options)
+
+
+def get_return_moments(prices):
+    """Compute mean and covariance of daily returns of each stock.
+
+    Parameters
+    ----------
+        prices: daily prices for each stock in portfolio
+
+    Returns
+    -------
+        mean_ret: average daily return of each stock
+        cov_ret: stocks x stocks covariance matrix of daily returns
+    """
+    values = np.asarray(prices, dtype=np.float64)
+    daily_rets = (values[1:] / values[:-1]) - 1
+    return daily_rets.mean(axis=0), np.cov(daily_rets, rowvar=False)
+
+
+def find_min_variance_allocations(mean_ret, cov_ret, target_return=None, allocs_guess=None):
+    """Find long-only allocations with minimum variance of daily returns.
+
+    Parameters
+    ----------
+        mean_ret: average daily return of each stock
+        cov_ret: covariance matrix of daily returns
+        target_return: required average daily return (default: unconstrained)
+        allocs_guess: starting allocations (default: equal weights)
+
+    Returns
+    -------
+        allocs: allocations, as fractions that sum to 1.0
+        success: whether the solver converged
+    """
+    n_stocks = len(mean_ret)
+    if allocs_guess is None:
+        allocs_guess = np.ones(n_stocks) / n_stocks
+
+    def fun(allocs):
+        '''Variance of daily returns and its gradient'''
+        cov_allocs = cov_ret.dot(allocs)
+        return allocs.dot(cov_allocs), 2 * cov_allocs
+
+    bnds = [(0.0, 1.0)] * n_stocks
+    cons = [{'type': 'eq', 'fun': lambda inputs: 1.0 - np.sum(inputs),
+             'jac': lambda inputs: -np.ones_like(inputs)}]
+    if target_return is not None:
+        cons.append({'type': 'eq', 'fun': lambda inputs: mean_ret.dot(inputs) - target_return,
+                     'jac': lambda inputs: mean_ret})
+    options = {'maxiter': max(100, 2 * n_stocks)}
+    min_result = spo.minimize(fun, allocs_guess, method='SLSQP', jac=True,
+                              bounds=bnds, constraints=cons, options=options)
+    return min_result.x, min_result.success
+
+
+def find_max_sharpe_allocations(mean_ret, cov_ret, daily_rf=0, allocs_guess=None):
+    """Find long-only allocations with maximum Sharpe ratio of expected daily returns.
+
+    The Sharpe ratio does not change with the scale of the allocations, so
+    the sum-to-one constraint is replaced by a penalty that only pins the
+    scale; that leaves simple bounds, which L-BFGS-B handles in O(stocks)
+    per step on top of one covariance product.
+
+    Parameters
+    ----------
+        mean_ret: average daily return of each stock
+        cov_ret: covariance matrix of daily returns (must be positive definite)
+        daily_rf: daily risk-free rate of return (default: 0%)
+        allocs_guess: starting allocations (default: equal weights)
+
+    Returns
+    -------
+        allocs: allocations, as fractions that sum to 1.0
+        success: whether the solver converged
+    """
+    n_stocks = len(mean_ret)
+    if allocs_guess is None:
+        allocs_guess = np.ones(n_stocks) / n_stocks
+    excess_ret = mean_ret - daily_rf
+
+    def fun(allocs):
+        '''Negative (daily) Sharpe ratio plus scale penalty, and gradient'''
+        cov_allocs = cov_ret.dot(allocs)
+        std_ret = np.sqrt(allocs.dot(cov_allocs))
+        excess = excess_ret.dot(allocs)
+        grad = (excess_ret * std_ret - excess * cov_allocs / std_ret) / std_ret ** 2
+        scale = np.sum(allocs) - 1.0
+        return -excess / std_ret + scale ** 2, -grad + 2 * scale
+
+    bnds = [(0.0, None)] * n_stocks
+    min_result = spo.minimize(fun, allocs_guess, method='L-BFGS-B', jac=True, bounds=bnds,
+                              options={'ftol': 1e-12, 'gtol': 1e-8})
+    return min_result.x / np.sum(min_result.x), min_result.success
+
+
+def _solve_frontier(args):
+    '''Solve consecutive frontier points, each warm-started from the last'''
+    mean_ret, cov_ret, target_returns, allocs_guess = args
+    allocs = np.empty((len(target_returns), len(mean_ret)))
+    success = np.empty(len(target_returns), dtype=bool)
+    for i, target_return in enumerate(target_returns):
+        allocs[i], success[i] = find_min_variance_allocations(
+            mean_ret, cov_ret, target_return, allocs_guess)
+        allocs_guess = allocs[i]
+    return allocs, success
+
+
+def find_efficient_frontier(prices, n_points=50, daily_rf=0, samples_per_year=252, processes=None):
+    """Trace the long-only efficient frontier of a stock portfolio.
+
+    Targets run from the return of the minimum variance portfolio up to the
+    best single stock. Return moments are computed once and shared by all
+    points; each point is warm-started from the previous one. With processes
+    set, the targets are split into contiguous runs solved in worker processes.
+
+    Parameters
+    ----------
+        prices: daily prices for each stock in portfolio
+        n_points: number of points along the frontier (default: 50)
+        daily_rf: daily risk-free rate of return (default: 0%)
+        samples_per_year: frequency of sampling (default: 252 trading days)
+        processes: number of worker processes (default: solve in this process)
+
+    Returns
+    -------
+        allocs: points x stocks allocations along the frontier
+        avg_daily_ret: expected average daily return at each point
+        std_daily_ret: expected standard deviation of daily returns at each point
+        sharpe_ratio: expected annualized Sharpe ratio at each point
+        success: whether the solver converged at each point
+    """
+    mean_ret, cov_ret = get_return_moments(prices)
+    min_allocs, _ = find_min_variance_allocations(mean_ret, cov_ret)
+    target_returns = np.linspace(mean_ret.dot(min_allocs), mean_ret.max(), n_points)
+
+    if processes:
+        chunks = np.array_split(target_returns, min(processes, n_points))
+        pool = Pool(processes)
+        try:
+            results = pool.map(_solve_frontier, [(mean_ret, cov_ret, chunk, min_allocs)
+                                                 for chunk in chunks if len(chunk)])
+        finally:
+            pool.close()
+            pool.join()
+        allocs = np.concatenate([result[0] for result in results])
+        success = np.concatenate([result[1] for result in results])
+    else:
+        allocs, success = _solve_frontier((mean_ret, cov_ret, target_returns, min_allocs))
+
+    avg_daily_ret = allocs.dot(mean_ret)
+    std_daily_ret = np.sqrt(np.einsum('ij,jk,ik->i', allocs, cov_ret, allocs).clip(0))
+    sharpe_ratio = np.sqrt(samples_per_year) * (avg_daily_ret - daily_rf) / std_daily_ret
+    return allocs, avg_daily_ret, std_daily_ret, sharpe_ratio, success
+
+
+def _init_multistart(normed, daily_rf, samples_per_year):
+    '''Build the Sharpe objective once per worker process'''
+    global _worker_fun
+    normed.flags.writeable = False
+    _worker_fun = get_sharpe_objective(normed, daily_rf, samples_per_year)
+
+
+def _solve_multistart(allocs_guess):
+    '''Solve one start with the worker's Sharpe objective'''
+    min_result = _maximize_sharpe(_worker_fun, allocs_guess)
+    return min_result.x, -min_result.fun, min_result.success
+
+
+def find_optimal_allocations_multistart(prices, n_starts=32, daily_rf=0, samples_per_year=252,
+                                        processes=None, tol=1e-4, seed=None):
+    """Maximize Sharpe ratio from many random starting allocations.
+
+    Starting allocations are drawn uniformly from the simplex (Dirichlet(1))
+    with equal weights as the first start. Normalized prices are handed to
+    each worker process once, when the pool starts, and shared by every
+    start that worker solves. Converged solutions closer than tol in every
+    allocation are merged.
+
+    Parameters
+    ----------
+        prices: daily prices for each stock in portfolio
+        n_starts: number of starting allocations (default: 32)
+        daily_rf: daily risk-free rate of return (default: 0%)
+        samples_per_year: frequency of sampling (default: 252 trading days)
+        processes: number of worker processes (default: solve in this process)
+        tol: largest allocation difference of merged solutions (default: 1e-4)
+        seed: random seed for starting allocations
+
+    Returns
+    -------
+        result: MultiStartResult with the best allocations and Sharpe ratio,
+            the distinct solutions sorted best first, their Sharpe ratios,
+            how many starts reached each, and the converged and total starts
+    """
+    normed = get_normed_prices(prices)
+    n_stocks = normed.shape[1]
+    rng = np.random.RandomState(seed)
+    starts = rng.dirichlet(np.ones(n_stocks), size=n_starts)
+    starts[0] = 1.0 / n_stocks
+
+    if processes:
+        pool = Pool(processes, _init_multistart, (normed, daily_rf, samples_per_year))
+        try:
+            results = pool.map(_solve_multistart, starts)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        fun = get_sharpe_objective(normed, daily_rf, samples_per_year)
+        results = []
+        for allocs_guess in starts:
+            min_result = _maximize_sharpe(fun, allocs_guess)
+            results.append((min_result.x, -min_result.fun, min_result.success))
+
+    converged = [(allocs, sharpe_ratio) for allocs, sharpe_ratio, success in results if success]
+    converged.sort(key=lambda result: -result[1])
+    solutions, sharpe_ratios, hits = [], [], []
+    for allocs, sharpe_ratio in converged:
+        for i, solution in enumerate(solutions):
+            if np.abs(allocs - solution).max() < tol:
+                hits[i] += 1
+                break
+        else:
+            solutions.append(allocs)
+            sharpe_ratios.append(sharpe_ratio)
+            hits.append(1)
+
+    solutions = np.array(solutions).reshape(-1, n_stocks)
+    best_allocs = solutions[0] if len(solutions) else None
+    best_sharpe = sharpe_ratios[0] if sharpe_ratios else np.nan
+    return MultiStartResult(best_allocs, best_sharpe, solutions, np.array(sharpe_ratios),
+                            np.array(hits, dtype=int), len(converged), n_starts)
+
+
+def walk_forward_allocations(prices, lookback=252, freq='M', daily_rf=0, start_val=1,
+                             shrinkage=0.1):
+    """Re-optimize allocations for Sharpe ratio at every rebalance date.
+
+    Rebalancing happens on the last trading day of each freq period once
+    lookback daily returns are available. Running sums of the returns and of
+    their outer products are updated with only the days entering and leaving
+    the lookback window, and each solve is warm-started from the previous
+    allocations. Between rebalances the portfolio is held (not rebalanced).
+
+    Parameters
+    ----------
+        prices: daily prices for each stock in portfolio
+        lookback: number of daily returns used at each rebalance (default: 252)
+        freq: pandas offset alias of the rebalance period (default: month end)
+        daily_rf: daily risk-free rate of return (default: 0%)
+        start_val: portfolio value at the first rebalance (default: 1)
+        shrinkage: weight moved from the sample covariance onto its diagonal,
+            needed when there are more stocks than lookback days (default: 0.1)
+
+    Returns
+    -------
+        allocs: DataFrame of allocations, one row per rebalance date
+        port_val: daily out-of-sample portfolio value from the first rebalance
+    """
+    values = np.asarray(prices, dtype=np.float64)
+    daily_rets = (values[1:] / values[:-1]) - 1  # row i is the return into day i + 1
+    n_stocks = values.shape[1]
+    positions = pd.Series(np.arange(len(values)), index=prices.index).resample(freq).last()
+    positions = positions.dropna().values.astype(int)
+    positions = positions[positions >= lookback]
+
+    sum_ret = np.zeros(n_stocks)
+    sum_sq = np.zeros((n_stocks, n_stocks))
+    lo = hi = 0  # daily_rets[lo:hi] are in the running sums
+    allocs = np.empty((len(positions), n_stocks))
+    allocs_guess = None
+    port_val = np.empty(len(values) - positions[0]) if len(positions) else np.empty(0)
+    val = start_val
+    for k, pos in enumerate(positions):
+        # Slide the window to daily_rets[pos - lookback:pos]
+        if pos - lookback >= hi:
+            lo = hi = pos - lookback
+            sum_ret[:] = 0
+            sum_sq[:] = 0
+        entering, leaving = daily_rets[hi:pos], daily_rets[lo:pos - lookback]
+        sum_ret += entering.sum(axis=0) - leaving.sum(axis=0)
+        sum_sq += entering.T.dot(entering) - leaving.T.dot(leaving)
+        lo, hi = pos - lookback, pos
+
+        mean_ret = sum_ret / lookback
+        cov_ret = (sum_sq - np.outer(sum_ret, sum_ret) / lookback) / (lookback - 1)
+        cov_ret *= 1 - shrinkage
+        cov_ret.flat[::n_stocks + 1] /= 1 - shrinkage
+        allocs[k], _ = find_max_sharpe_allocations(mean_ret, cov_ret, daily_rf, allocs_guess)
+        allocs_guess = allocs[k]
+
+        # Hold allocs[k] until the next rebalance (or the last day)
+        end = positions[k + 1] if k + 1 < len(positions) else len(values) - 1
+        held = val * (values[pos:end + 1] / values[pos]).dot(allocs[k])
+        port_val[pos - positions[0]:end + 1 - positions[0]] = held
+        val = held[-1]
+
+    allocs = pd.DataFrame(allocs, index=prices.index[positions], columns=prices.columns)
+    port_val = pd.Series(port_val, index=prices.index[len(values) - len(port_val):])
+    return allocs, port_val
+
+
 def optimize_portfolio(start_date, end_date, symbols):
     """Simulate and optimize portfolio allocations."""
     # Read in adjusted closing prices for given symbols, date range
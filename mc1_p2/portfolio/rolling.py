@@ -0,0 +1,193 @@
+"""MC1-P2: Rolling-window statistics on portfolio values."""
+
+import pandas as pd
+import numpy as np
+
+from util import get_data
+from analysis import get_normed_prices, get_portfolio_value_batch
+
+WINDOWS = (20, 60, 252)
+
+
+def _as_columns(port_vals):
+    """Return port_vals as a days x portfolios float array and whether it was 1-D."""
+    port_vals = np.asarray(port_vals, dtype=np.float64)
+    if port_vals.ndim == 1:
+        return port_vals[:, np.newaxis], True
+    return port_vals, False
+
+
+def _rolling_sum(values, window):
+    """Sum of each trailing window of rows, from a single running sum."""
+    totals = np.cumsum(values, axis=0)
+    totals[window:] = totals[window:] - totals[:-window]
+    return totals[window - 1:]
+
+
+def _pad_blocks(values, window):
+    """Pad rows with the last row to a whole number of window sized blocks."""
+    n_blocks = -(-len(values) // window)
+    padding = n_blocks * window - len(values)
+    padded = np.concatenate([values, np.repeat(values[-1:], padding, axis=0)])
+    return padded.reshape((n_blocks, window) + values.shape[1:])
+
+
+def _reverse_accumulate(ufunc, blocks):
+    """Accumulate ufunc backwards along the rows of each block."""
+    return ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1]
+
+
+def get_rolling_stats(port_vals, window, daily_rf=0, samples_per_year=252):
+    """Calculate statistics over every trailing window of daily returns.
+
+    Each window's mean and deviation come from running sums of the (centered)
+    daily returns, so all windows of all portfolios cost O(days) in total.
+    Row t holds the same numbers get_portfolio_stats gives on port_val[t-window:t+1];
+    the first window rows are NaN.
+
+    Parameters
+    ----------
+        port_vals: daily portfolio values, one column per portfolio
+        window: number of daily returns in each window
+        daily_rf: daily risk-free rate of return (default: 0%)
+        samples_per_year: frequency of sampling (default: 252 trading days)
+
+    Returns
+    -------
+        avg_daily_ret: rolling average of daily returns
+        std_daily_ret: rolling standard deviation of daily returns
+        sharpe_ratio: rolling annualized Sharpe ratio
+        sortino_ratio: rolling annualized Sortino ratio
+    """
+    values, squeeze = _as_columns(port_vals)
+    daily_ret = (values[1:] / values[:-1]) - 1
+    # Center the returns first to keep the running sum of squares well conditioned
+    center = daily_ret.mean(axis=0)
+    centered = daily_ret - center
+    sum_ret = _rolling_sum(centered, window)
+    sum_sq = _rolling_sum(centered ** 2, window)
+    downside = np.minimum(daily_ret - daily_rf, 0)
+    sum_down = _rolling_sum(downside ** 2, window)
+
+    stats = np.empty((4,) + values.shape)
+    stats.fill(np.nan)
+    avg_daily_ret, std_daily_ret, sharpe_ratio, sortino_ratio = stats
+    avg_daily_ret[window:] = center + sum_ret / window
+    variance = (sum_sq - sum_ret ** 2 / window) / (window - 1)
+    std_daily_ret[window:] = np.sqrt(np.maximum(variance, 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        excess = avg_daily_ret[window:] - daily_rf
+        sharpe_ratio[window:] = np.sqrt(samples_per_year) * excess / std_daily_ret[window:]
+        sortino_ratio[window:] = np.sqrt(samples_per_year) * excess / np.sqrt(sum_down / window)
+
+    if squeeze:
+        stats = stats[:, :, 0]
+    return tuple(stats)
+
+
+def get_rolling_drawdown(port_vals, window):
+    """Calculate drawdown and maximum drawdown over every trailing window.
+
+    Windows cover the same window+1 values as get_rolling_stats. Running peaks,
+    troughs and drawdowns are accumulated forward and backward inside blocks of
+    window values (van Herk/Gil-Werman), so the cost is O(days) for any window.
+
+    Parameters
+    ----------
+        port_vals: daily portfolio values, one column per portfolio
+        window: number of daily returns in each window
+
+    Returns
+    -------
+        drawdown: value relative to the window's peak, minus 1 (zero or negative)
+        max_drawdown: worst peak-to-trough drawdown within the window
+    """
+    values, squeeze = _as_columns(port_vals)
+    n_days = len(values)
+    size = window + 1
+    blocks = _pad_blocks(values, size)
+
+    # Forward from each block start: running peak, trough and worst drawdown
+    prefix_max = np.maximum.accumulate(blocks, axis=1)
+    prefix_min = np.minimum.accumulate(blocks, axis=1)
+    prefix_mdd = np.minimum.accumulate(blocks / prefix_max - 1, axis=1)
+    # Backward from each block end: running peak and worst drawdown
+    suffix_max = _reverse_accumulate(np.maximum, blocks)
+    suffix_min = _reverse_accumulate(np.minimum, blocks)
+    suffix_mdd = _reverse_accumulate(np.minimum, suffix_min / blocks - 1)
+
+    shape = (-1,) + values.shape[1:]
+    prefix_max, prefix_min, prefix_mdd, suffix_max, suffix_mdd = [
+        a.reshape(shape)[:n_days]
+        for a in (prefix_max, prefix_min, prefix_mdd, suffix_max, suffix_mdd)]
+
+    # A window ending at day t starts at day s = t - window, in the previous block
+    # unless t closes its own block; join the tail of that block with the head of t's
+    ends = np.arange(window, n_days)
+    starts = ends - window
+    aligned = ((ends + 1) % size == 0)[:, np.newaxis]
+    head = slice(window, n_days)
+    peak = np.where(aligned, prefix_max[head],
+                    np.maximum(suffix_max[starts], prefix_max[head]))
+    cross = prefix_min[head] / suffix_max[starts] - 1
+    mdd = np.where(aligned, prefix_mdd[head],
+                   np.minimum(np.minimum(suffix_mdd[starts], prefix_mdd[head]), cross))
+
+    drawdown = np.empty_like(values)
+    drawdown.fill(np.nan)
+    max_drawdown = drawdown.copy()
+    drawdown[head] = values[head] / peak - 1
+    max_drawdown[head] = mdd
+
+    if squeeze:
+        return drawdown[:, 0], max_drawdown[:, 0]
+    return drawdown, max_drawdown
+
+
+def get_rolling_report(port_vals, windows=WINDOWS, daily_rf=0, samples_per_year=252):
+    """Rolling Sharpe ratio, volatility and drawdowns for several window lengths.
+
+    Parameters
+    ----------
+        port_vals: daily portfolio values (Series)
+        windows: window lengths in trading days (default: 20, 60 and 252)
+        daily_rf: daily risk-free rate of return (default: 0%)
+        samples_per_year: frequency of sampling (default: 252 trading days)
+
+    Returns
+    -------
+        report: DataFrame indexed like port_vals, with (statistic, window) columns
+    """
+    columns = {}
+    for window in windows:
+        avg_daily_ret, std_daily_ret, sharpe_ratio, sortino_ratio = get_rolling_stats(
+            port_vals, window, daily_rf, samples_per_year)
+        drawdown, max_drawdown = get_rolling_drawdown(port_vals, window)
+        columns[('Sharpe Ratio', window)] = sharpe_ratio
+        columns[('Sortino Ratio', window)] = sortino_ratio
+        columns[('Volatility', window)] = std_daily_ret
+        columns[('Drawdown', window)] = drawdown
+        columns[('Max Drawdown', window)] = max_drawdown
+    report = pd.DataFrame(columns, index=port_vals.index)
+    return report.sort_index(axis=1)
+
+
+def test_run():
+    """Driver function."""
+    start_date = '2008-01-01'
+    end_date = '2010-12-31'
+    symbols = ['GOOG', 'AAPL', 'GLD', 'XOM']
+    allocs = [0.25, 0.25, 0.25, 0.25]
+
+    dates = pd.date_range(start_date, end_date)
+    prices = get_data(symbols, dates)[symbols]
+    port_val = pd.Series(
+        get_portfolio_value_batch(get_normed_prices(prices), allocs)[:, 0],
+        index=prices.index)
+
+    report = get_rolling_report(port_val)
+    print report.dropna().tail()
+
+
+if __name__ == "__main__":
+    test_run()
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from portfolio.analysis import (get_portfolio_value, get_portfolio_stats,
+                                get_normed_prices, get_portfolio_value_batch,
+                                get_portfolio_stats_batch)
+
+
+def random_port_vals(days=100, portfolios=5):
+    rng = np.random.RandomState(0)
+    returns = 1 + rng.randn(days, portfolios) * 0.01
+    return np.cumprod(returns, axis=0)
+
+
+def test_get_portfolio_stats_batch():
+    port_vals = random_port_vals()
+    dates = pd.date_range('2010-01-01', periods=len(port_vals))
+    actual = get_portfolio_stats_batch(port_vals)
+    for i in range(port_vals.shape[1]):
+        expected = get_portfolio_stats(pd.Series(port_vals[:, i], index=dates))
+        for batch_stat, stat in zip(actual, expected):
+            np.testing.assert_almost_equal(batch_stat[i], stat)
+
+
+def test_get_portfolio_value_batch():
+    dates = pd.date_range('2010-01-01', periods=100)
+    prices = pd.DataFrame(random_port_vals(portfolios=4) * 50, index=dates)
+    allocs = np.random.RandomState(1).dirichlet(np.ones(4), size=10)
+    actual = get_portfolio_value_batch(get_normed_prices(prices), allocs, 1000)
+    for i, alloc in enumerate(allocs):
+        expected = get_portfolio_value(prices, alloc, 1000)
+        np.testing.assert_allclose(actual[:, i], expected.values)
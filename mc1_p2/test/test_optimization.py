@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import scipy.optimize as spo
+
+from portfolio.analysis import get_normed_prices, get_portfolio_value, get_portfolio_stats
+from portfolio.optimization import (get_sharpe_objective, find_optimal_allocations,
+                                    find_efficient_frontier, find_optimal_allocations_multistart,
+                                    get_return_moments, find_max_sharpe_allocations,
+                                    walk_forward_allocations)
+from test_analysis import random_port_vals
+
+
+def random_prices(days=250, stocks=20):
+    dates = pd.date_range('2010-01-01', periods=days)
+    return pd.DataFrame(random_port_vals(days, stocks) * 50, index=dates)
+
+
+def test_get_sharpe_objective():
+    prices = random_prices()
+    fun = get_sharpe_objective(get_normed_prices(prices))
+    allocs = np.random.RandomState(1).dirichlet(np.ones(prices.shape[1]))
+    value, grad = fun(allocs)
+    sharpe_ratio = get_portfolio_stats(get_portfolio_value(prices, allocs))[3]
+    np.testing.assert_almost_equal(value, -sharpe_ratio)
+    error = spo.check_grad(lambda x: fun(x)[0], lambda x: fun(x)[1], allocs)
+    assert error < 1e-5 * np.linalg.norm(grad)
+
+
+def test_find_optimal_allocations():
+    prices = random_prices()
+    allocs = find_optimal_allocations(prices, disp=False)
+    np.testing.assert_almost_equal(allocs.sum(), 1.0)
+    assert (allocs > -1e-8).all()
+    fun = get_sharpe_objective(get_normed_prices(prices))
+    equal = np.ones(prices.shape[1]) / prices.shape[1]
+    assert fun(allocs)[0] < fun(equal)[0]
+
+
+def test_find_efficient_frontier():
+    prices = random_prices(stocks=8)
+    allocs, avg_daily_ret, std_daily_ret, sharpe_ratio, success = find_efficient_frontier(prices, n_points=20)
+    assert success.all()
+    np.testing.assert_allclose(allocs.sum(axis=1), 1.0)
+    assert (np.diff(avg_daily_ret) > 0).all()
+    assert (np.diff(std_daily_ret) > -1e-10).all()
+    parallel = find_efficient_frontier(prices, n_points=20, processes=2)
+    np.testing.assert_allclose(parallel[2], std_daily_ret, rtol=1e-4)
+
+
+def test_find_optimal_allocations_multistart():
+    prices = random_prices(stocks=8)
+    result = find_optimal_allocations_multistart(prices, n_starts=8, seed=0)
+    assert result.converged == result.hits.sum() <= result.starts == 8
+    assert (np.diff(result.sharpe_ratios) <= 0).all()
+    single = find_optimal_allocations(prices, disp=False)
+    fun = get_sharpe_objective(get_normed_prices(prices))
+    assert result.sharpe_ratio >= -fun(single)[0] - 1e-8
+    parallel = find_optimal_allocations_multistart(prices, n_starts=8, processes=2, seed=0)
+    np.testing.assert_allclose(parallel.allocs, result.allocs)
+
+
+def test_find_max_sharpe_allocations():
+    mean_ret, cov_ret = get_return_moments(random_prices(stocks=8))
+    allocs, success = find_max_sharpe_allocations(mean_ret, cov_ret)
+    assert success
+    np.testing.assert_almost_equal(allocs.sum(), 1.0)
+    sharpe = lambda a: a.dot(mean_ret) / np.sqrt(a.dot(cov_ret).dot(a))
+    starts = np.random.RandomState(2).dirichlet(np.ones(8), size=100)
+    assert sharpe(allocs) >= max(sharpe(a) for a in starts)
+
+
+def test_walk_forward_allocations():
+    dates = pd.bdate_range('2010-01-01', periods=300)
+    prices = pd.DataFrame(random_port_vals(300, 6) * 50, index=dates)
+    lookback = 60
+    allocs, port_val = walk_forward_allocations(prices, lookback=lookback, shrinkage=0)
+    assert port_val.index[0] == allocs.index[0]
+    assert port_val.index[-1] == dates[-1]
+    for date, row in allocs.iterrows():
+        pos = dates.get_loc(date)
+        mean_ret, cov_ret = get_return_moments(prices.iloc[pos - lookback:pos + 1])
+        expected, _ = find_max_sharpe_allocations(mean_ret, cov_ret)
+        np.testing.assert_allclose(row.values, expected, atol=1e-4)
+    # Held between rebalances: value moves with the allocated price changes
+    first, second = allocs.index[:2]
+    held = prices.loc[first:second] / prices.loc[first]
+    np.testing.assert_allclose(port_val.loc[first:second], held.dot(allocs.loc[first]))
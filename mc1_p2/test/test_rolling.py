@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from portfolio.analysis import get_portfolio_stats
+from portfolio.rolling import get_rolling_stats, get_rolling_drawdown
+from test_analysis import random_port_vals
+
+
+def max_drawdown(port_val):
+    return (port_val / np.maximum.accumulate(port_val) - 1).min()
+
+
+def test_get_rolling_stats():
+    port_vals = random_port_vals(days=80, portfolios=3)
+    dates = pd.date_range('2010-01-01', periods=len(port_vals))
+    window = 20
+    avg_daily_ret, std_daily_ret, sharpe_ratio, sortino_ratio = get_rolling_stats(port_vals, window)
+    assert np.isnan(sharpe_ratio[:window]).all()
+    for t in range(window, len(port_vals)):
+        for i in range(port_vals.shape[1]):
+            port_val = pd.Series(port_vals[t - window:t + 1, i], index=dates[t - window:t + 1])
+            cum_ret, avg, std, sharpe = get_portfolio_stats(port_val)
+            np.testing.assert_almost_equal(avg_daily_ret[t, i], avg)
+            np.testing.assert_almost_equal(std_daily_ret[t, i], std)
+            np.testing.assert_almost_equal(sharpe_ratio[t, i], sharpe)
+            daily_ret = np.diff(port_val.values) / port_val.values[:-1]
+            downside = np.sqrt(np.mean(np.minimum(daily_ret, 0) ** 2))
+            np.testing.assert_almost_equal(sortino_ratio[t, i], np.sqrt(252) * avg / downside)
+
+
+def test_get_rolling_drawdown():
+    port_vals = random_port_vals(days=80, portfolios=3)
+    for window in (1, 7, 20, 79):
+        drawdown, mdd = get_rolling_drawdown(port_vals, window)
+        assert np.isnan(mdd[:window]).all()
+        for t in range(window, len(port_vals)):
+            values = port_vals[t - window:t + 1]
+            np.testing.assert_almost_equal(drawdown[t], values[-1] / values.max(axis=0) - 1)
+            for i in range(port_vals.shape[1]):
+                np.testing.assert_almost_equal(mdd[t, i], max_drawdown(values[:, i]))
@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from util import get_data
+from order_log import OrderLog
 
 
 class BollingerBand(object):
@@ -47,8 +48,7 @@ class BollingerDeltaTradingEngine(object):
         self.short_limit = short_limit
         self.current_position = 0
         self.history = pd.DataFrame()
-        self.recommendation_history = pd.DataFrame(
-            columns=['Symbol', 'Order', 'Shares'])
+        self.recommendation_history = OrderLog()
         self.bollinger = BollingerBand(window)
         self.signal = BollingerBand(window)
         self.current_data = None
@@ -90,15 +90,10 @@ class BollingerDeltaTradingEngine(object):
         '''Recommend whether to buy, sell, or hold.'''
 
         def trade(order, amount):
-            recommendation = pd.DataFrame(
-                [[self.symbol, order.upper(), amount]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[self.current_date]
-            )
+            recommendation = self.recommendation_history.add(
+                self.current_date, self.symbol, order.upper(), amount)
             print recommendation
             print self.current_position, percent_b, signal_percent_b
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
 
         def can_buy():
             return self.current_position < self.long_limit
@@ -180,9 +175,9 @@ class BollingerDeltaTradingEngine(object):
             0: 'k',
         }
         position = 0
-        for date, recommendation in self.recommendation_history.iterrows():
-            delta = recommendation.ix['Shares']
-            if recommendation.ix['Order'] == 'BUY':
+        for date, symbol, order, shares in self.recommendation_history:
+            delta = shares
+            if order == 'BUY':
                 position += delta
             else:
                 position -= delta
@@ -193,9 +188,12 @@ class BollingerDeltaTradingEngine(object):
         #ax.legend(loc=3)
         plt.show()
 
+    def get_order_book(self):
+        '''Return recommended orders as an orders dataframe for compute_portvals.'''
+        return self.recommendation_history.to_frame()
+
     def create_order_book(self, path):
-        self.recommendation_history.to_csv(
-            path, columns=['Symbol', 'Order', 'Shares'], index_label='Date')
+        self.recommendation_history.to_frame().to_csv(path, index_label='Date')
 
 
 def run_bollinger_delta(debug=False):
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""MC2-P2: Benchmarks on synthetic data."""
+
+import os
+import shutil
+import tempfile
+import timeit
+import argparse
+import numpy as np
+import pandas as pd
+
+import util
+import marketsim
+
+
+def write_synthetic_csvs(base_dir, n_symbols, start_date='2000-01-01',
+                         end_date='2011-12-31', seed=0):
+    '''Write SPY plus n_symbols random walk price files in Yahoo CSV format.'''
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range(start_date, end_date)
+    symbols = ['SYM{:04d}'.format(i) for i in range(n_symbols)]
+    for symbol in ['SPY'] + symbols:
+        prices = 50 * np.exp(np.cumsum(rng.randn(len(dates)) * 0.02))
+        df = pd.DataFrame({'Adj Close': prices, 'Close': prices}, index=dates)
+        df.index.name = 'Date'
+        df.iloc[::-1].to_csv(util.symbol_to_path(symbol, base_dir),
+                             columns=['Close', 'Adj Close'], float_format='%.2f')
+    return symbols
+
+
+def time_call(func, repeat=3, setup='pass'):
+    '''Best wall time in seconds out of repeat calls, each after setup.'''
+    return min(timeit.repeat(func, setup, number=1, repeat=repeat))
+
+
+def bench_get_data(counts=(10, 100, 1000), repeat=3):
+    '''Time get_data over a decade of prices for increasing symbol counts.
+
+    The price cache is cleared before every call, so each time is a cold
+    read from CSV files or from the store.
+    '''
+    base_dir = tempfile.mkdtemp()
+    try:
+        symbols = write_synthetic_csvs(base_dir, max(counts))
+        dates = pd.date_range('2001-01-01', '2010-12-31')
+        load = lambda count: util.get_data(symbols[:count], dates,
+                                           base_dir=base_dir)
+        cold = util.price_cache.clear
+        csv_times = [time_call(lambda: load(count), repeat, cold) for count in counts]
+        util.ingest(base_dir, fields=['Adj Close'])
+        store_times = [time_call(lambda: load(count), repeat, cold) for count in counts]
+        print '{:>8} {:>12} {:>12}'.format('symbols', 'csv (s)', 'store (s)')
+        for row in zip(counts, csv_times, store_times):
+            print '{:>8} {:>12.4f} {:>12.4f}'.format(*row)
+    finally:
+        shutil.rmtree(base_dir)
+
+
+def synthetic_order_book(prices, n_orders, seed=0):
+    '''Random BUY/SELL orders on the dates and symbols of prices.'''
+    rng = np.random.RandomState(seed)
+    symbols = [s for s in prices.columns if s != 'Cash']
+    orders = pd.DataFrame({
+        'Symbol': np.array(symbols)[rng.randint(len(symbols), size=n_orders)],
+        'Order': np.array(['BUY', 'SELL'])[rng.randint(2, size=n_orders)],
+        'Shares': rng.randint(1, 50, size=n_orders) * 100,
+    }, index=prices.index[rng.randint(len(prices), size=n_orders)])
+    return orders.sort_index()
+
+
+def synthetic_prices(n_symbols, start_date='2001-01-01', end_date='2010-12-31',
+                     seed=0):
+    '''Random walk prices frame with a Cash column, as built by get_prices.'''
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range(start_date, end_date)
+    values = 50 * np.exp(np.cumsum(rng.randn(len(dates), n_symbols) * 0.02, axis=0))
+    prices = pd.DataFrame(values, index=dates,
+                          columns=['SYM{:04d}'.format(i) for i in range(n_symbols)])
+    prices['Cash'] = 1.0
+    return prices
+
+
+def bench_get_trades(counts=(1000, 10000, 100000), repeat=3):
+    '''Time get_trades on synthetic order books of increasing size.'''
+    prices = synthetic_prices(100)
+    start_date, end_date = prices.index[0], prices.index[-1]
+    print '{:>8} {:>12}'.format('orders', 'time (s)')
+    for count in counts:
+        orders = synthetic_order_book(prices, count)
+        seconds = time_call(
+            lambda: marketsim.get_trades(orders, prices, start_date, end_date),
+            repeat)
+        print '{:>8} {:>12.4f}'.format(count, seconds)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run benchmarks')
+    parser.add_argument('benchmark', choices=['get_data', 'get_trades'],
+                        help='benchmark to run')
+    parser.add_argument('-r', '--repeat', default=3, type=int,
+                        help='number of timed repetitions')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    globals()['bench_' + args.benchmark](repeat=args.repeat)
@@ -1,15 +1,18 @@
 """MC2-P2: Bollinger Strategy."""
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from util import get_data
+from order_log import OrderLog
+from indicators import RollingStd, is_valid
 
 
 class BollingerTradingEngine(object):
     '''Trade recommendation engine based on bollinger bands.'''
 
     def __init__(self, symbol, start_value=None, long_limit=None,
-                 short_limit=None, window=20, threshold=0.5):
+                 short_limit=None, window=20, threshold=0.5, keep_history=False):
         self.symbol = symbol
         self.start_value = start_value
         self.long_limit = long_limit
@@ -17,31 +20,79 @@ class BollingerTradingEngine(object):
         self.current_position = 0
         self.window = window
         self.threshold = threshold
-        self.history = pd.Series()
-        self.signal_history = pd.Series()
-        self.recommendation_history = pd.DataFrame(
-            columns=['Symbol', 'Order', 'Shares'])
-        self.sma = None
-        self.std = None
-        self.last_sma = None
-        self.last_std = None
-        self.signal_sma = None
-        self.signal_std = None
-        self.signal_last_sma = None
-        self.signal_last_std = None
+        self.keep_history = keep_history
+        self.recommendation_history = OrderLog()
+        # Bands of the last window prices and signal prices, in O(1) per bar
+        self.bands = RollingStd(window)
+        self.signal_bands = RollingStd(window)
+        self.last_sma = np.nan
+        self.last_std = np.nan
+        self.signal_last_sma = np.nan
+        self.signal_last_std = np.nan
+        self.updated = False
+        self.current_date = None
+        self.current_price = None
+        self.last_price = None
+        self.signal_current_price = None
+        self.signal_last_price = None
+        # Full history, only kept for plotting
+        self.history_dates = np.empty(window if keep_history else 0, dtype=object)
+        self.history_prices = np.empty(window if keep_history else 0)
+
+    @property
+    def sma(self):
+        return self.bands.mean
+
+    @property
+    def std(self):
+        return self.bands.value
+
+    @property
+    def signal_sma(self):
+        return self.signal_bands.mean
+
+    @property
+    def signal_std(self):
+        return self.signal_bands.value
+
+    @property
+    def size(self):
+        '''Number of bars seen so far, not counting ones missing a price.'''
+        return self.bands.count
+
+    @property
+    def history(self):
+        '''All prices seen so far, as a series (needs keep_history).'''
+        if not self.keep_history:
+            raise ValueError('price history is only kept with keep_history=True')
+        return pd.Series(self.history_prices[:self.size],
+                         index=self.history_dates[:self.size])
 
     def add_data_point(self, date, price, signal_price):
-        self.history = self.history.append(pd.Series({date: price}))
-        self.signal_history = self.signal_history.append(pd.Series({date: signal_price}))
-        if self.history.size >= self.window:
-            self.last_sma = self.sma
-            self.last_std = self.std
-            self.sma = self.history.ix[-self.window:].mean(axis=0)
-            self.std = self.history.ix[-self.window:].std(axis=0)
-            self.signal_last_sma = self.signal_sma
-            self.signal_last_std = self.signal_std
-            self.signal_sma = self.signal_history.ix[-self.window:].mean(axis=0)
-            self.signal_std = self.signal_history.ix[-self.window:].std(axis=0)
+        # Bars without both prices (None or NaN) are skipped
+        self.updated = is_valid(price) and is_valid(signal_price)
+        if not self.updated:
+            return
+        if self.keep_history:
+            self.append_history(date, price)
+        self.last_price = self.current_price
+        self.signal_last_price = self.signal_current_price
+        self.current_date, self.current_price = date, price
+        self.signal_current_price = signal_price
+        self.last_sma, self.last_std = self.bands.mean, self.bands.value
+        self.signal_last_sma = self.signal_bands.mean
+        self.signal_last_std = self.signal_bands.value
+        self.bands.update(price)
+        self.signal_bands.update(signal_price)
+
+    def append_history(self, date, price):
+        '''Append to the full history, doubling its arrays when they fill up.'''
+        if self.size == len(self.history_prices):
+            capacity = max(2 * self.size, 1)
+            self.history_dates = np.resize(self.history_dates, capacity)
+            self.history_prices = np.resize(self.history_prices, capacity)
+        self.history_dates[self.size] = date
+        self.history_prices[self.size] = price
 
     def get_recommendation(self):
         '''Recommend whether to buy, sell, or hold.'''
@@ -57,14 +108,8 @@ class BollingerTradingEngine(object):
 
         def buy():
             self.current_position += self.long_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'BUY', self.long_limit]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'BUY', self.long_limit)
 
         def is_short_entry():
             return (
@@ -77,18 +122,12 @@ class BollingerTradingEngine(object):
 
         def sell():
             self.current_position += self.short_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'SELL', abs(self.short_limit)]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'SELL', abs(self.short_limit))
 
         def not_enough_data():
             return (
-                self.history.size < 2 or
+                not self.updated or np.isnan(self.last_sma) or
                 not all([self.sma, self.std, self.last_sma, self.last_std])
             )
 
@@ -121,11 +160,11 @@ class BollingerTradingEngine(object):
         if not_enough_data():
             return None
 
-        current_date = self.history.index[-1]
-        last_price = self.history[-2]
-        current_price = self.history[-1]
-        signal_current_price = self.signal_history[-1]
-        signal_last_price = self.signal_history[-2]
+        current_date = self.current_date
+        last_price = self.last_price
+        current_price = self.current_price
+        signal_current_price = self.signal_current_price
+        signal_last_price = self.signal_last_price
         pb = self.percent_b(current_price, self.sma, self.std)
         last_pb = self.percent_b(last_price, self.last_sma, self.last_std)
         signal_pb = self.percent_b(signal_current_price, self.signal_sma, self.signal_std)
@@ -154,39 +193,43 @@ class BollingerTradingEngine(object):
         return (price - lower) / (upper - lower)
 
     def stats(self):
-        return self.sma, self.std, self.history.size, self.current_position
+        return self.sma, self.std, self.size, self.current_position
 
     def plot(self, title='', xlabel="Date", ylabel="Price"):
         """Plot stock prices with a custom title and meaningful axis labels."""
-        rolling_sma = pd.rolling_mean(self.history, self.window)
-        rolling_std = pd.rolling_std(self.history, self.window)
+        history = self.history
+        rolling_sma = pd.rolling_mean(history, self.window)
+        rolling_std = pd.rolling_std(history, self.window)
         upper_band = rolling_sma + 2 * rolling_std
         lower_band = rolling_sma - 2 * rolling_std
         fig, ax = plt.subplots()
         fig.set_size_inches(8, 6, forward=True)
         ax.set_xlabel("Date")
         ax.set_ylabel("Price")
-        ax.plot(self.history.index, self.history, "b-", label=self.symbol)
-        ax.plot(self.history.index, rolling_sma, "y-", label='SMA')
-        ax.plot(self.history.index, upper_band, "c-", label='Bollinger Bands')
-        ax.plot(self.history.index, lower_band, "c-", label='')
+        ax.plot(history.index, history, "b-", label=self.symbol)
+        ax.plot(history.index, rolling_sma, "y-", label='SMA')
+        ax.plot(history.index, upper_band, "c-", label='Bollinger Bands')
+        ax.plot(history.index, lower_band, "c-", label='')
         colors = {
             100: 'g',
             -100: 'r',
             0: 'k',
         }
         position = 0
-        for date, recommendation in self.recommendation_history.iterrows():
-            delta = 100 if recommendation.ix['Order'] == 'BUY' else -100
+        for date, symbol, order, shares in self.recommendation_history:
+            delta = 100 if order == 'BUY' else -100
             position += delta
             color = colors.get(position, 'b')
             ax.axvline(x=date, color=color)
         ax.legend(loc=3)
         plt.show()
 
+    def get_order_book(self):
+        '''Return recommended orders as an orders dataframe for compute_portvals.'''
+        return self.recommendation_history.to_frame()
+
     def create_order_book(self, path):
-        self.recommendation_history.to_csv(
-            path, columns=['Symbol', 'Order', 'Shares'], index_label='Date')
+        self.recommendation_history.to_frame().to_csv(path, index_label='Date')
 
 
 def run_bollinger(debug=False):
@@ -202,7 +245,7 @@ def run_bollinger(debug=False):
     #prices_SPY = prices_all['SPY']  # only SPY, for comparison later
 
     engine = BollingerTradingEngine('IBM', long_limit=100,
-                                    short_limit=-100)
+                                    short_limit=-100, keep_history=True)
     for date, row in prices.iterrows():
         engine.add_data_point(date, row['IBM'], row['SPY'])
         engine.get_recommendation()
@@ -1,36 +1,79 @@
 """MC2-P2: Bollinger Strategy."""
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from util import get_data
+from order_log import OrderLog
+from indicators import RollingStd, ArrayRollingStd, is_valid
 
 
 class BollingerTradingEngine(object):
     '''Trade recommendation engine based on bollinger bands.'''
 
     def __init__(self, symbol, start_value=None, long_limit=None,
-                 short_limit=None, window=20):
+                 short_limit=None, window=20, keep_history=False):
         self.symbol = symbol
         self.start_value = start_value
         self.long_limit = long_limit
         self.short_limit = short_limit
         self.current_position = 0
         self.window = window
-        self.history = pd.Series()
-        self.recommendation_history = pd.DataFrame(
-            columns=['Symbol', 'Order', 'Shares'])
-        self.sma = None
-        self.std = None
-        self.last_sma = None
-        self.last_std = None
+        self.keep_history = keep_history
+        self.recommendation_history = OrderLog()
+        # SMA and standard deviation of the last window prices, in O(1) per bar
+        self.bands = RollingStd(window)
+        self.last_sma = np.nan
+        self.last_std = np.nan
+        self.updated = False
+        self.current_date = None
+        self.current_price = None
+        self.last_price = None
+        # Full history, only kept for plotting
+        self.history_dates = np.empty(window if keep_history else 0, dtype=object)
+        self.history_prices = np.empty(window if keep_history else 0)
+
+    @property
+    def sma(self):
+        return self.bands.mean
+
+    @property
+    def std(self):
+        return self.bands.value
+
+    @property
+    def size(self):
+        '''Number of prices seen so far, not counting missing ones.'''
+        return self.bands.count
+
+    @property
+    def history(self):
+        '''All prices seen so far, as a series (needs keep_history).'''
+        if not self.keep_history:
+            raise ValueError('price history is only kept with keep_history=True')
+        return pd.Series(self.history_prices[:self.size],
+                         index=self.history_dates[:self.size])
 
     def add_data_point(self, date, price):
-        self.history = self.history.append(pd.Series({date: price}))
-        if self.history.size >= self.window:
-            self.last_sma = self.sma
-            self.last_std = self.std
-            self.sma = self.history.ix[-self.window:].mean(axis=0)
-            self.std = self.history.ix[-self.window:].std(axis=0)
+        # Bars without a price (None or NaN) are skipped
+        self.updated = is_valid(price)
+        if not self.updated:
+            return
+        if self.keep_history:
+            self.append_history(date, price)
+        self.last_price = self.current_price
+        self.current_date, self.current_price = date, price
+        self.last_sma, self.last_std = self.bands.mean, self.bands.value
+        self.bands.update(price)
+
+    def append_history(self, date, price):
+        '''Append to the full history, doubling its arrays when they fill up.'''
+        if self.size == len(self.history_prices):
+            capacity = max(2 * self.size, 1)
+            self.history_dates = np.resize(self.history_dates, capacity)
+            self.history_prices = np.resize(self.history_prices, capacity)
+        self.history_dates[self.size] = date
+        self.history_prices[self.size] = price
 
     def get_recommendation(self):
         '''Recommend whether to buy, sell, or hold.'''
@@ -46,14 +89,8 @@ class BollingerTradingEngine(object):
 
         def buy():
             self.current_position += self.long_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'BUY', self.long_limit]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'BUY', self.long_limit)
 
         def is_short_entry():
             return (
@@ -66,18 +103,12 @@ class BollingerTradingEngine(object):
 
         def sell():
             self.current_position += self.short_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'SELL', abs(self.short_limit)]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'SELL', abs(self.short_limit))
 
         def not_enough_data():
             return (
-                self.history.size < 2 or
+                not self.updated or np.isnan(self.last_sma) or
                 not all([self.sma, self.std, self.last_sma, self.last_std])
             )
 
@@ -95,9 +126,9 @@ class BollingerTradingEngine(object):
 
         if not_enough_data():
             return None
-        current_date = self.history.index[-1]
-        last_price = self.history[-2]
-        current_price = self.history[-1]
+        current_date = self.current_date
+        last_price = self.last_price
+        current_price = self.current_price
         if is_long_entry() and can_buy():
             return buy()
         elif is_short_entry() and can_sell():
@@ -109,39 +140,107 @@ class BollingerTradingEngine(object):
         return None
 
     def stats(self):
-        return self.sma, self.std, self.history.size, self.current_position
+        return self.sma, self.std, self.size, self.current_position
 
     def plot(self, title='', xlabel="Date", ylabel="Price"):
         """Plot stock prices with a custom title and meaningful axis labels."""
-        rolling_sma = pd.rolling_mean(self.history, self.window)
-        rolling_std = pd.rolling_std(self.history, self.window)
+        history = self.history
+        rolling_sma = pd.rolling_mean(history, self.window)
+        rolling_std = pd.rolling_std(history, self.window)
         upper_band = rolling_sma + 2 * rolling_std
         lower_band = rolling_sma - 2 * rolling_std
         fig, ax = plt.subplots()
         fig.set_size_inches(8, 6, forward=True)
         ax.set_xlabel("Date")
         ax.set_ylabel("Price")
-        ax.plot(self.history.index, self.history, "b-", label=self.symbol)
-        ax.plot(self.history.index, rolling_sma, "y-", label='SMA')
-        ax.plot(self.history.index, upper_band, "c-", label='Bollinger Bands')
-        ax.plot(self.history.index, lower_band, "c-", label='')
+        ax.plot(history.index, history, "b-", label=self.symbol)
+        ax.plot(history.index, rolling_sma, "y-", label='SMA')
+        ax.plot(history.index, upper_band, "c-", label='Bollinger Bands')
+        ax.plot(history.index, lower_band, "c-", label='')
         colors = {
             100: 'g',
             -100: 'r',
             0: 'k',
         }
         position = 0
-        for date, recommendation in self.recommendation_history.iterrows():
-            delta = 100 if recommendation.ix['Order'] == 'BUY' else -100
+        for date, symbol, order, shares in self.recommendation_history:
+            delta = 100 if order == 'BUY' else -100
             position += delta
             color = colors.get(position, 'b')
             ax.axvline(x=date, color=color)
         ax.legend(loc=3)
         plt.show()
 
+    def get_order_book(self):
+        '''Return recommended orders as an orders dataframe for compute_portvals.'''
+        return self.recommendation_history.to_frame()
+
     def create_order_book(self, path):
-        self.recommendation_history.to_csv(
-            path, columns=['Symbol', 'Order', 'Shares'], index_label='Date')
+        self.recommendation_history.to_frame().to_csv(path, index_label='Date')
+
+
+def get_bands(prices, window=20):
+    '''Rolling SMA and standard deviation of each column of a prices array.
+
+    Steps an ArrayRollingStd through the rows, which does the engine's
+    RollingStd arithmetic on all columns at once, so bands come out bit for
+    bit the same and price/band ties resolve as they do in
+    BollingerTradingEngine. Rows before the first full window are NaN, and
+    rows without a price carry the bands of the column's last price.
+    '''
+    bands = ArrayRollingStd(window, prices.shape[1])
+    sma = np.empty(prices.shape)
+    std = np.empty(prices.shape)
+    for i, row in enumerate(prices):
+        std[i] = bands.update(row)
+        sma[i] = bands.mean
+    return sma, std
+
+
+def run_batch(prices, long_limit=100, short_limit=-100, window=20):
+    '''Run the Bollinger strategy over every column of prices at once.
+
+    Band crossings are computed for all dates and symbols up front; only the
+    bands and position limits need a pass over the dates, each step working
+    on arrays of symbols.
+    Returns the orders each symbol's BollingerTradingEngine would recommend,
+    ordered by date and then by column.
+    '''
+    values = np.asarray(prices, dtype=np.float64)
+    sma, std = get_bands(values, window)
+    # Engines skip bars without a price and compare with the last price seen
+    seen = pd.DataFrame(values).ffill().values
+    last_price, current_price = seen[:-1], values[1:]
+    last_sma, current_sma = sma[:-1], sma[1:]
+    last_std, current_std = std[:-1], std[1:]
+    with np.errstate(invalid='ignore'):
+        # Engines skip a bar until both bands exist and are non-zero
+        ready = (last_std != 0) & (current_std != 0) & ~np.isnan(last_sma)
+        long_entry = ready & (last_price <= last_sma - 2 * last_std) & (current_price > current_sma - 2 * current_std)
+        short_entry = ready & (last_price >= last_sma + 2 * last_std) & (current_price < current_sma + 2 * current_std)
+        above_sma = ready & (last_price <= last_sma) & (current_price > current_sma)
+        below_sma = ready & (last_price >= last_sma) & (current_price < current_sma)
+
+    position = np.zeros(values.shape[1], dtype=int)
+    orders = np.zeros(current_price.shape, dtype=int)
+    for i in range(len(orders)):
+        buy = long_entry[i] & (position < long_limit)
+        sell = ~buy & short_entry[i] & (position > short_limit)
+        exit_long = ~buy & ~sell & above_sma[i] & (position >= long_limit)
+        exit_short = ~buy & ~sell & ~exit_long & below_sma[i] & (position <= short_limit)
+        orders[i] = np.where(buy | exit_short, long_limit,
+                             np.where(sell | exit_long, short_limit, 0))
+        position += orders[i]
+
+    days, cols = np.nonzero(orders)
+    shares = orders[days, cols]
+    order_book = pd.DataFrame({
+        'Symbol': np.asarray(prices.columns)[cols],
+        'Order': np.where(shares > 0, 'BUY', 'SELL'),
+        'Shares': np.abs(shares),
+    }, index=prices.index[days + 1], columns=['Symbol', 'Order', 'Shares'])
+    order_book.index.name = 'Date'
+    return order_book
 
 
 def run_bollinger(debug=False):
@@ -157,7 +256,7 @@ def run_bollinger(debug=False):
     #prices_SPY = prices_all['SPY']  # only SPY, for comparison later
 
     engine = BollingerTradingEngine('IBM', start_value=10000, long_limit=100,
-                                    short_limit=-100)
+                                    short_limit=-100, keep_history=True)
     for date, price in prices_IBM.iteritems():
         engine.add_data_point(date, price)
         recommendation = engine.get_recommendation()
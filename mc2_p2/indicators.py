@@ -0,0 +1,447 @@
+"""MC2-P2: Streaming technical indicators and their vectorized counterparts.
+
+Each indicator class takes one value per update() in O(1) time and ignores
+None or NaN values. The Array* classes hold the same state for many series
+(symbols) at once and advance them all with one array of values per call.
+The get_* function of an indicator computes every value of a whole series
+(or of each column of a 2-D array) at once and returns the numbers the class
+would have returned after each update.
+"""
+
+import numpy as np
+from scipy.signal import lfilter
+
+
+def is_valid(value):
+    '''Whether value can be fed to an indicator (not None or NaN).'''
+    return value is not None and value == value
+
+
+class SMA(object):
+    '''Simple moving average of the last periods values.'''
+    __slots__ = ('periods', 'window', 'count', 'total', 'value')
+
+    def __init__(self, periods):
+        self.periods = periods
+        self.window = [0.0] * periods
+        self.count = 0
+        self.total = 0.0
+        self.value = np.nan
+
+    def update(self, value):
+        if is_valid(value):
+            slot = self.count % self.periods
+            self.total += value - self.window[slot]
+            self.window[slot] = value
+            self.count += 1
+            if slot == self.periods - 1:
+                # Resum once per lap so rounding errors cannot pile up
+                self.total = sum(self.window)
+            if self.count >= self.periods:
+                self.value = self.total / self.periods
+        return self.value
+
+
+class RollingStd(object):
+    '''Sample standard deviation (and mean) of the last periods values.'''
+    __slots__ = ('periods', 'offset', 'window', 'count', 'total', 'total_sq',
+                 'mean', 'value')
+
+    def __init__(self, periods):
+        self.periods = periods
+        self.offset = None
+        self.window = [0.0] * periods
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.mean = np.nan
+        self.value = np.nan
+
+    def update(self, value):
+        if is_valid(value):
+            if self.offset is None:
+                self.offset = value
+            # Sums of values less the first one stay well conditioned
+            slot = self.count % self.periods
+            delta = value - self.offset
+            dropped = self.window[slot]
+            self.total += delta - dropped
+            self.total_sq += delta * delta - dropped * dropped
+            self.window[slot] = delta
+            self.count += 1
+            if slot == self.periods - 1:
+                self.total = sum(self.window)
+                self.total_sq = sum(d * d for d in self.window)
+            if self.count >= self.periods:
+                mean = self.total / self.periods
+                var = (self.total_sq - self.total * mean) / (self.periods - 1)
+                self.mean = self.offset + mean
+                self.value = np.sqrt(max(var, 0.0))
+        return self.value
+
+
+class EMA(object):
+    '''Exponential moving average, seeded with the SMA of the first periods values.'''
+    __slots__ = ('periods', 'multiplier', 'count', 'total', 'value')
+
+    def __init__(self, periods):
+        self.periods = periods
+        self.multiplier = 2.0 / (periods + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = np.nan
+
+    def update(self, value):
+        if is_valid(value):
+            self.count += 1
+            if self.count > self.periods:
+                self.value += (value - self.value) * self.multiplier
+            else:
+                self.total += value
+                if self.count == self.periods:
+                    self.value = self.total / self.periods
+        return self.value
+
+
+class ROC(object):
+    '''Rate of change over periods values, as a fraction.'''
+    __slots__ = ('periods', 'window', 'count', 'value')
+
+    def __init__(self, periods):
+        self.periods = periods
+        self.window = [0.0] * (periods + 1)
+        self.count = 0
+        self.value = np.nan
+
+    def update(self, value):
+        if is_valid(value):
+            slot = self.count % (self.periods + 1)
+            self.window[slot] = value
+            self.count += 1
+            if self.count > self.periods:
+                oldest = self.window[self.count % (self.periods + 1)]
+                self.value = (value / oldest) - 1
+        return self.value
+
+
+class TRIX(object):
+    '''Rate of change of a smoothing-times repeated EMA.'''
+    __slots__ = ('emas', 'roc')
+
+    def __init__(self, periods=15, smoothing=3, roc_periods=1):
+        self.emas = tuple(EMA(periods) for _ in range(smoothing))
+        self.roc = ROC(roc_periods)
+
+    def update(self, value):
+        for ema in self.emas:
+            value = ema.update(value)
+        return self.roc.update(value)
+
+    @property
+    def value(self):
+        return self.roc.value
+
+
+class PercentB(object):
+    '''Bollinger %b: where the value sits between the bands (0 lower, 1 upper).'''
+    __slots__ = ('width', 'std', 'value')
+
+    def __init__(self, periods=20, width=2):
+        self.width = width
+        self.std = RollingStd(periods)
+        self.value = np.nan
+
+    def update(self, value):
+        if is_valid(value):
+            std = self.std.update(value)
+            if std > 0:
+                lower = self.std.mean - self.width * std
+                self.value = (value - lower) / (2 * self.width * std)
+            else:
+                self.value = np.nan
+        return self.value
+
+    @property
+    def sma(self):
+        return self.std.mean
+
+    @property
+    def upper(self):
+        return self.std.mean + self.width * self.std.value
+
+    @property
+    def lower(self):
+        return self.std.mean - self.width * self.std.value
+
+
+def _push(window, count, values):
+    '''Write each series' valid value into its ring slot and count it.
+
+    Returns the rows (series) that took a value, the values, the slots they
+    went into and the values they replaced.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    rows = np.flatnonzero(~np.isnan(values))
+    values = values[rows]
+    slots = count[rows] % window.shape[1]
+    dropped = window[rows, slots]
+    window[rows, slots] = values
+    count[rows] += 1
+    return rows, values, slots, dropped
+
+
+def _sum_slots(window):
+    '''Sum each row's slots in slot order, as sum() does for one series' list.
+
+    Adding one column at a time keeps the Array* resums bit for bit equal to
+    the streaming classes; numpy's pairwise row sums round differently.
+    '''
+    total = np.zeros(len(window))
+    for column in window.T:
+        total += column
+    return total
+
+
+class ArraySMA(object):
+    '''SMA of n series at once.'''
+    __slots__ = ('periods', 'window', 'count', 'total', 'value')
+
+    def __init__(self, periods, n):
+        self.periods = periods
+        self.window = np.zeros((n, periods))
+        self.count = np.zeros(n, dtype=int)
+        self.total = np.zeros(n)
+        self.value = np.empty(n)
+        self.value.fill(np.nan)
+
+    def update(self, values):
+        rows, values, slots, dropped = _push(self.window, self.count, values)
+        self.total[rows] += values - dropped
+        lap = rows[slots == self.periods - 1]
+        self.total[lap] = _sum_slots(self.window[lap])
+        ready = rows[self.count[rows] >= self.periods]
+        self.value[ready] = self.total[ready] / self.periods
+        return self.value
+
+
+class ArrayRollingStd(object):
+    '''Sample standard deviation (and mean) of n series at once.'''
+    __slots__ = ('periods', 'offset', 'window', 'count', 'total', 'total_sq',
+                 'mean', 'value')
+
+    def __init__(self, periods, n):
+        self.periods = periods
+        self.offset = np.empty(n)
+        self.offset.fill(np.nan)
+        self.window = np.zeros((n, periods))
+        self.count = np.zeros(n, dtype=int)
+        self.total = np.zeros(n)
+        self.total_sq = np.zeros(n)
+        self.mean = np.empty(n)
+        self.mean.fill(np.nan)
+        self.value = np.empty(n)
+        self.value.fill(np.nan)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        first = np.isnan(self.offset) & ~np.isnan(values)
+        self.offset[first] = values[first]
+        rows, values, slots, dropped = _push(self.window, self.count, values - self.offset)
+        self.total[rows] += values - dropped
+        self.total_sq[rows] += values * values - dropped * dropped
+        lap = rows[slots == self.periods - 1]
+        self.total[lap] = _sum_slots(self.window[lap])
+        self.total_sq[lap] = _sum_slots(self.window[lap] * self.window[lap])
+        ready = rows[self.count[rows] >= self.periods]
+        mean = self.total[ready] / self.periods
+        var = (self.total_sq[ready] - self.total[ready] * mean) / (self.periods - 1)
+        self.mean[ready] = self.offset[ready] + mean
+        self.value[ready] = np.sqrt(np.maximum(var, 0.0))
+        return self.value
+
+
+class ArrayEMA(object):
+    '''EMA of n series at once.'''
+    __slots__ = ('periods', 'multiplier', 'count', 'total', 'value')
+
+    def __init__(self, periods, n):
+        self.periods = periods
+        self.multiplier = 2.0 / (periods + 1)
+        self.count = np.zeros(n, dtype=int)
+        self.total = np.zeros(n)
+        self.value = np.empty(n)
+        self.value.fill(np.nan)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        rows = np.flatnonzero(~np.isnan(values))
+        values = values[rows]
+        self.count[rows] += 1
+        count = self.count[rows]
+        hot = count > self.periods
+        warm, hot_rows = rows[~hot], rows[hot]
+        self.value[hot_rows] += (values[hot] - self.value[hot_rows]) * self.multiplier
+        self.total[warm] += values[~hot]
+        seeded = rows[count == self.periods]
+        self.value[seeded] = self.total[seeded] / self.periods
+        return self.value
+
+
+class ArrayROC(object):
+    '''Rate of change of n series at once.'''
+    __slots__ = ('periods', 'window', 'count', 'value')
+
+    def __init__(self, periods, n):
+        self.periods = periods
+        self.window = np.zeros((n, periods + 1))
+        self.count = np.zeros(n, dtype=int)
+        self.value = np.empty(n)
+        self.value.fill(np.nan)
+
+    def update(self, values):
+        rows, values, slots, dropped = _push(self.window, self.count, values)
+        ready = self.count[rows] > self.periods
+        rows = rows[ready]
+        oldest = self.window[rows, self.count[rows] % (self.periods + 1)]
+        self.value[rows] = (values[ready] / oldest) - 1
+        return self.value
+
+
+class ArrayTRIX(object):
+    '''TRIX of n series at once.'''
+    __slots__ = ('emas', 'roc')
+
+    def __init__(self, periods, n, smoothing=3, roc_periods=1):
+        self.emas = tuple(ArrayEMA(periods, n) for _ in range(smoothing))
+        self.roc = ArrayROC(roc_periods, n)
+
+    def update(self, values):
+        for ema in self.emas:
+            values = ema.update(values)
+        return self.roc.update(values)
+
+    @property
+    def value(self):
+        return self.roc.value
+
+
+def apply_valid(func, values):
+    '''Apply func along axis 0 to the valid values only, like the streaming classes.
+
+    Results are scattered back to the positions of valid values and carried
+    forward over invalid ones, which is what update() returns there.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if valid.all():
+        return func(values)
+    if values.ndim > 1:
+        columns = values.reshape(len(values), -1)
+        result = np.column_stack([apply_valid(func, column) for column in columns.T])
+        return result.reshape(values.shape)
+    result = np.empty_like(values)
+    result.fill(np.nan)
+    result[valid] = func(values[valid])
+    # Carry the last valid position's result forward
+    positions = np.where(valid, np.arange(len(values)), -1)
+    positions = np.maximum.accumulate(positions)
+    started = positions >= 0
+    result[started] = result[positions[started]]
+    return result
+
+
+def _nan_rows(values, rows):
+    '''Float array shaped like values with its first rows set to NaN.'''
+    result = np.empty_like(values)
+    result[:rows] = np.nan
+    return result
+
+
+def _rolling_sums(values, periods):
+    '''Sums of each trailing window of periods rows, from the periods-th row on.
+
+    Running sums restart every periods rows; a window is the tail of one
+    block plus the head of the next, so no sum grows past two windows.
+    '''
+    n_rows = len(values)
+    n_blocks = -(-n_rows // periods)
+    blocks = np.zeros((n_blocks * periods,) + values.shape[1:])
+    blocks[:n_rows] = values
+    blocks = blocks.reshape((n_blocks, periods) + values.shape[1:])
+    heads = np.cumsum(blocks, axis=1).reshape((-1,) + values.shape[1:])[:n_rows]
+    tails = np.cumsum(blocks[:, ::-1], axis=1)[:, ::-1]
+    tails = tails.reshape((-1,) + values.shape[1:])[:n_rows]
+    ends = np.arange(periods - 1, n_rows)
+    totals = heads[periods - 1:].copy()
+    split = (ends + 1) % periods != 0
+    totals[split] += tails[ends[split] - periods + 1]
+    return totals
+
+
+def get_sma(values, periods):
+    '''SMA of every window of periods values, as SMA.update returns them.'''
+    def sma(values):
+        result = _nan_rows(values, periods - 1)
+        offset = values[:1]
+        result[periods - 1:] = offset + _rolling_sums(values - offset, periods) / periods
+        return result
+    return apply_valid(sma, values)
+
+
+def get_rolling_std(values, periods):
+    '''Sample standard deviation of every window, as RollingStd.update returns them.'''
+    def rolling_std(values):
+        result = _nan_rows(values, periods - 1)
+        deltas = values - values[:1]
+        total = _rolling_sums(deltas, periods)
+        total_sq = _rolling_sums(deltas * deltas, periods)
+        var = (total_sq - total * total / periods) / (periods - 1)
+        result[periods - 1:] = np.sqrt(np.maximum(var, 0.0))
+        return result
+    return apply_valid(rolling_std, values)
+
+
+def get_ema(values, periods):
+    '''EMA of a series, as EMA.update returns it.'''
+    multiplier = 2.0 / (periods + 1)
+
+    def ema(values):
+        result = _nan_rows(values, periods - 1)
+        if len(values) < periods:
+            return result
+        seed = values[:periods].mean(axis=0)
+        result[periods - 1] = seed
+        # e[t] = multiplier * x[t] + (1 - multiplier) * e[t - 1], started from the seed
+        initial = ((1 - multiplier) * np.asarray(seed))[np.newaxis]
+        result[periods:], _ = lfilter([multiplier], [1, multiplier - 1],
+                                      values[periods:], axis=0, zi=initial)
+        return result
+    return apply_valid(ema, values)
+
+
+def get_roc(values, periods):
+    '''Rate of change over periods values, as ROC.update returns it.'''
+    def roc(values):
+        result = _nan_rows(values, periods)
+        result[periods:] = (values[periods:] / values[:-periods]) - 1
+        return result
+    return apply_valid(roc, values)
+
+
+def get_trix(values, periods=15, smoothing=3, roc_periods=1):
+    '''TRIX of a series, as TRIX.update returns it.'''
+    for _ in range(smoothing):
+        values = get_ema(values, periods)
+    return get_roc(values, roc_periods)
+
+
+def get_percent_b(values, periods=20, width=2):
+    '''Bollinger %b of a series, as PercentB.update returns it.'''
+    def percent_b(values):
+        sma = get_sma(values, periods)
+        std = get_rolling_std(values, periods)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = (values - (sma - width * std)) / (2 * width * std)
+            result[~(std > 0)] = np.nan
+        return result
+    return apply_valid(percent_b, values)
@@ -3,6 +3,7 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 from util import get_data
+from order_log import OrderLog
 import numpy as np
 
 
@@ -75,8 +76,7 @@ class KalmanTradingEngine(object):
         self.history = pd.Series()
         self.smoothed = pd.Series()
         self.std = pd.Series()
-        self.recommendation_history = pd.DataFrame(
-            columns=['Symbol', 'Order', 'Shares'])
+        self.recommendation_history = OrderLog()
 
     def add_data_point(self, date, price):
         self.history = self.history.append(pd.Series({date: price}))
@@ -98,14 +98,8 @@ class KalmanTradingEngine(object):
         def buy():
             amount = self.long_limit - self.current_position
             self.current_position = self.long_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'BUY', amount]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'BUY', amount)
 
         def is_falling():
             return self.model.current_mommentum < -velocity_threshold
@@ -116,14 +110,8 @@ class KalmanTradingEngine(object):
         def sell():
             amount = self.current_position - self.short_limit
             self.current_position = self.short_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'SELL', amount]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'SELL', amount)
 
         current_date = self.history.index[-1]
         if is_rising() and can_buy():
@@ -156,15 +144,18 @@ class KalmanTradingEngine(object):
         ax.plot(self.history.index, upper_band, "c-",
                 label='Kalman Bollinger Bands')
         ax.plot(self.history.index, lower_band, "c-", label='')
-        for date, recommendation in self.recommendation_history.iterrows():
-            color = 'g' if recommendation.ix['Order'] == 'BUY' else 'r'
+        for date, symbol, order, shares in self.recommendation_history:
+            color = 'g' if order == 'BUY' else 'r'
             ax.axvline(x=date, color=color)
         ax.legend(loc=3)
         plt.show()
 
+    def get_order_book(self):
+        '''Return recommended orders as an orders dataframe for compute_portvals.'''
+        return self.recommendation_history.to_frame()
+
     def create_order_book(self, path):
-        self.recommendation_history.to_csv(
-            path, columns=['Symbol', 'Order', 'Shares'], index_label='Date')
+        self.recommendation_history.to_frame().to_csv(path, index_label='Date')
 
 
 def run_kalman(debug=False):
@@ -3,22 +3,40 @@
 import pandas as pd
 import sys
 import os
+import cPickle as pickle
 import numpy as np
+from collections import namedtuple, deque
 
-from util import (get_data, plot_data)
+from util import (get_data, get_calendar, plot_data, TradingCalendar)
 from portfolio.analysis import get_portfolio_value, get_portfolio_stats
 #from portfolio.analysis import get_portfolio_value, get_portfolio_stats, plot_normalized_data
 
 
-def compute_portvals(start_date, end_date, orders_file, start_val):
-    """Compute daily portfolio value given a sequence of orders in a CSV file.
+MICROS = 1000000  # cash is kept in integer micro-dollars
+
+# commission: fixed cost per order, per_share: fee per share traded,
+# slippage: fraction of price every fill pays against the order's direction,
+# impact: further fraction of price per share filled, so large orders move
+# the price more (linear market impact)
+TransactionCosts = namedtuple('TransactionCosts',
+                              ['commission', 'per_share', 'slippage', 'impact'])
+NO_COSTS = TransactionCosts(commission=0.0, per_share=0.0, slippage=0.0,
+                            impact=0.0)
+
+
+def compute_portvals(start_date, end_date, orders_file, start_val,
+                     max_leverage=2.0, costs=NO_COSTS):
+    """Compute daily portfolio value given a sequence of orders.
 
     Parameters
     ----------
         start_date: first date to track
         end_date: last date to track
-        orders_file: CSV file to read orders from
+        orders_file: CSV file to read orders from, or orders already in memory
+            (see get_orders)
         start_val: total starting cash available
+        max_leverage: reject a day's trades raising leverage above this (default: 2.0)
+        costs: TransactionCosts charged on every fill (default: none)
 
     Returns
     -------
@@ -31,84 +49,321 @@ def compute_portvals(start_date, end_date, orders_file, start_val):
     #end_date = orders.index.max()
     symbols = list(orders['Symbol'].unique())
     prices = get_prices(symbols, start_date, end_date)
-    trades = get_trades(orders, prices, start_date, end_date)
-    while True:
-        holdings = get_holdings(trades, prices, start_val)
-        values = get_values(holdings, prices)
-        leverage = get_leverage(values)
-        leverage_delta = leverage.diff()
-        over_leveraged_indexes = (
-            leverage[leverage > 2.0].index &
-            leverage_delta[leverage_delta > 0.0].index &
-            trades[trades != 0.0].dropna(how='all').index
-        )
-
-        if len(over_leveraged_indexes) == 0:
-            break
-        #print 'Trade results in leverage > 2.0. Removing.'
-        #print trades.loc[over_leveraged_indexes[0]]
-        #print
-        trades.loc[over_leveraged_indexes[0]] = 0.0
-    portval = get_portval(values)
-    return portval
-
-
-def get_portval(values):
-    '''Create daily total portfolio value.'''
-    return values.sum(axis=1)
-
-
-def get_values(holdings, prices):
-    '''Create values dataframe with daily values for each symbol.'''
-    return holdings * prices
-
-
-def get_holdings(trades_without_cash, prices, start_val):
-    '''Create holdings dataframe with daily positions for each symbol.'''
-    trades = trades_without_cash.copy()
-    trades['Cash'][0] += start_val
-    return trades.cumsum(axis=0)
-
-
-def get_leverage(holdings_row):
-    '''Create leverage dataframe calculated from daily holdings.'''
-    stocks = holdings_row.drop(['Cash'], axis=1)
-    cash = holdings_row['Cash']
-    a = stocks.abs().sum(axis=1)
-    b = stocks.sum(axis=1) + cash
-    return a / b
-
-
-def get_trades(orders, prices, start_date, end_date):
-    '''Create trades DF from orders.'''
+    orders = select_orders(orders, start_date, end_date)
+    held, shares, cash = get_ledger(orders, prices, start_val, max_leverage,
+                                    costs=costs)
+    portval = get_ledger_values(shares, cash, prices[held])
+    return pd.Series(portval[0], index=prices.index)
+
+
+def compute_portvals_batch(books, prices, start_val, max_leverage=2.0,
+                           costs=NO_COSTS):
+    """Compute daily portfolio values of many order books in one call.
+
+    Parameters
+    ----------
+        books: list of orders dataframes, or one orders dataframe with a Book
+            column of book ids 0..n-1
+        prices: shared prices dataframe with a Cash column (see get_prices),
+            covering every traded symbol over the dates to track
+        start_val: total starting cash available to each book
+        max_leverage: reject a day's trades raising leverage above this (default: 2.0)
+        costs: TransactionCosts charged on every fill (default: none)
+
+    Returns
+    -------
+        portvals: days x books array of portfolio values, orders outside the
+            dates of prices are ignored
+    """
+    if isinstance(books, pd.DataFrame):
+        orders = books
+        book_ids = books['Book'].values
+        n_books = book_ids.max() + 1
+    else:
+        orders = pd.concat(books)
+        book_ids = np.repeat(np.arange(len(books)), [len(b) for b in books])
+        n_books = len(books)
+    in_range = (orders.index >= prices.index[0]) & (orders.index <= prices.index[-1])
+    orders, book_ids = orders[in_range], book_ids[in_range]
+
+    held, shares, cash = get_ledger(orders, prices, start_val, max_leverage,
+                                    book_ids, n_books, costs)
+    return get_ledger_values(shares, cash, prices[held]).T
+
+
+def get_ledger(orders, prices, start_val, max_leverage=None, book_ids=0,
+               n_books=1, costs=NO_COSTS):
+    '''Create an integer ledger of daily positions from orders.
+
+    Only traded symbols get a column, so wide price frames with few traded
+    symbols cost nothing extra. With max_leverage set, trading days are
+    walked once with running positions for all books. A book's trades for
+    the day are rejected when they leave leverage above max_leverage and
+    higher than the day before.
+
+    Parameters
+    ----------
+        orders: orders dataframe, all within the dates of prices
+        prices: prices dataframe covering every traded symbol
+        start_val: total starting cash available to each book
+        max_leverage: leverage cap, or None for no cap
+        book_ids: book id of each order
+        n_books: number of books
+        costs: TransactionCosts charged on every fill
+
+    Returns
+    -------
+        held: traded symbols, the last axis of shares
+        shares: books x days x held int64 share counts
+        cash: books x days int64 cash in micro-dollars
+    '''
+    rows, cols, deltas = locate_orders(orders, prices)
+    held_cols, cols = np.unique(cols, return_inverse=True)
+    held = list(prices.columns[held_cols])
+    price_values = prices.values[:, held_cols]
+    n_days = len(prices)
+
+    share_trades = np.zeros((n_books, n_days, len(held)), dtype=np.int64)
+    np.add.at(share_trades, (book_ids, rows, cols), deltas)
+    cash_trades = np.zeros((n_books, n_days), dtype=np.int64)
+    cash_flows = get_cash_flows(deltas, price_values[rows, cols], costs)
+    np.add.at(cash_trades, (book_ids, rows),
+              np.round(cash_flows * MICROS).astype(np.int64))
+    start_cash = int(round(start_val * MICROS))
+
+    if max_leverage is None:
+        return held, share_trades.cumsum(axis=1), start_cash + cash_trades.cumsum(axis=1)
+    traded = share_trades.any(axis=2) | (cash_trades != 0)
+    shares = np.empty_like(share_trades)
+    cash = np.empty_like(cash_trades)
+    current_shares = np.zeros((n_books, len(held)), dtype=np.int64)
+    current_cash = np.empty(n_books, dtype=np.int64)
+    current_cash.fill(start_cash)
+    last_leverage = np.empty(n_books)
+    last_leverage.fill(np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(n_days):
+            proposed_shares = current_shares + share_trades[:, i]
+            proposed_cash = current_cash + cash_trades[:, i]
+            leverage = get_leverage(proposed_shares, proposed_cash, price_values[i])
+            reject = (traded[:, i] & (leverage > max_leverage) &
+                      (leverage - last_leverage > 0.0))
+            if reject.any():
+                proposed_shares[reject] = current_shares[reject]
+                proposed_cash[reject] = current_cash[reject]
+                leverage[reject] = get_leverage(
+                    current_shares[reject], current_cash[reject], price_values[i])
+            shares[:, i] = current_shares = proposed_shares
+            cash[:, i] = current_cash = proposed_cash
+            last_leverage = leverage
+    return held, shares, cash
+
+
+def get_cash_flows(shares, prices, costs=NO_COSTS):
+    '''Calculate the cash change of fills of signed shares at prices.
+
+    Fills move against their direction by costs.slippage plus costs.impact
+    per share filled, as fractions of price, and pay the commission plus
+    per-share fee; all arrays, no loop per order.
+    '''
+    size = np.abs(shares)
+    fill_prices = prices * (1 + np.sign(shares) * (costs.slippage + costs.impact * size))
+    fees = np.where(shares != 0, costs.commission, 0.0) + costs.per_share * size
+    return -1 * shares * fill_prices - fees
+
+
+def get_position_values(shares, prices):
+    '''Value positions at prices, counting symbols not held as 0.
+
+    A symbol with no price on a day (before it listed, say) is worth
+    nothing rather than NaN as long as no shares of it are held.
+    '''
+    return np.where(shares != 0, shares * prices, 0.0)
+
+
+def get_ledger_values(shares, cash, prices):
+    '''Create books x days portfolio values from ledger positions.'''
+    values = get_position_values(shares, prices.values)
+    return values.sum(axis=2) + cash / float(MICROS)
+
+
+def get_leverage(shares, cash, prices):
+    '''Calculate leverage of one day's books x symbols positions.'''
+    values = get_position_values(shares, prices)
+    return (np.abs(values).sum(axis=1) /
+            (values.sum(axis=1) + cash / float(MICROS)))
+
+
+class StreamingSimulator(object):
+    '''Incremental market simulator driven by order and bar events.
+
+    Orders are queued with on_order and filled at the prices of the next
+    on_bar call, which applies the same leverage rule as compute_portvals:
+    the bar's trades are rejected when they leave leverage above
+    max_leverage and higher than at the previous bar. Only held symbols
+    are tracked, so each event costs O(symbols held).
+
+    Daily values are kept for get_portvals, for the last history_size bars
+    only if it is set. Otherwise the history (and every checkpoint) grows
+    by one bar per on_bar call.
+    '''
+
+    def __init__(self, start_val, max_leverage=2.0, costs=NO_COSTS,
+                 history_size=None):
+        self.max_leverage = max_leverage
+        self.costs = costs
+        self.shares = {}  # held symbol -> int share count
+        self.cash = int(round(start_val * MICROS))  # micro-dollars
+        self.pending = []
+        self.date = None
+        self.leverage = np.nan
+        self.value = float(start_val)
+        self.history = deque(maxlen=history_size)
+
+    def on_order(self, order):
+        '''Queue an order to fill at the next bar.
+
+        order is a (symbol, 'BUY' or 'SELL', shares) tuple or an orders row
+        with Symbol, Order and Shares entries.
+        '''
+        if not isinstance(order, tuple):
+            order = (order['Symbol'], order['Order'], order['Shares'])
+        symbol, side, shares = order
+        # Reverse trade operation for Sell orders
+        operator = 1 if side == 'BUY' else -1
+        self.pending.append((symbol, operator * int(shares)))
+
+    def on_bar(self, date, prices):
+        '''Fill pending orders and mark held symbols to market.
+
+        Parameters
+        ----------
+            date: bar date
+            prices: mapping of symbol to price (e.g. a row of get_data),
+                covering every held or ordered symbol
+
+        Returns
+        -------
+            value: portfolio value after the bar
+        '''
+        shares = dict(self.shares)
+        cash = self.cash
+        for symbol, delta in self.pending:
+            shares[symbol] = shares.get(symbol, 0) + delta
+            cash_flow = get_cash_flows(delta, prices[symbol], self.costs)
+            cash += int(round(cash_flow * MICROS))
+        traded = any(delta for _, delta in self.pending)
+        self.pending = []
+
+        leverage, value = self.mark(shares, cash, prices)
+        if (traded and self.max_leverage is not None and
+                leverage > self.max_leverage and leverage - self.leverage > 0.0):
+            shares, cash = self.shares, self.cash
+            leverage, value = self.mark(shares, cash, prices)
+        self.shares = dict((s, n) for s, n in shares.items() if n != 0)
+        self.cash = cash
+        self.date = date
+        self.leverage = leverage
+        self.value = value
+        self.history.append((date, value))
+        return value
+
+    @staticmethod
+    def mark(shares, cash, prices):
+        '''Return leverage and portfolio value of positions at prices.'''
+        gross = net = 0.0
+        for symbol, count in shares.items():
+            if count != 0:
+                position = count * prices[symbol]
+                gross += abs(position)
+                net += position
+        value = net + cash / float(MICROS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            leverage = np.float64(gross) / value
+        return leverage, value
+
+    def get_portvals(self):
+        '''Return portfolio value for each bar seen so far.'''
+        dates, values = zip(*self.history) if self.history else ([], [])
+        return pd.Series(values, index=pd.DatetimeIndex(dates))
+
+    def checkpoint(self, path):
+        '''Save simulator state to path.'''
+        with open(path, 'wb') as f:
+            pickle.dump(self.__dict__, f, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def restore(cls, path):
+        '''Create a simulator from state saved by checkpoint.'''
+        simulator = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            simulator.__dict__.update(pickle.load(f))
+        return simulator
+
+
+def select_orders(orders, start_date, end_date):
+    '''Drop orders outside of start/end dates, reporting each one.'''
     dt_start_date = pd.to_datetime(start_date)
     dt_end_date = pd.to_datetime(end_date)
-    trades = clone_df(prices)
-    for index, row in orders.iterrows():
-        if index < dt_start_date or index > dt_end_date:
-            print 'Order out of date range:', index
-            continue
-        symbol = row['Symbol']
-        shares = row['Shares']
-        # Reverse trade operation for Sell orders
-        operator = 1 if row['Order'] == 'BUY' else -1
-        #print index, symbol, shares, operator
-        trades[symbol][index] += operator * shares
-        #print symbol, index, prices[symbol][index]
-        trades['Cash'][index] += -1 * operator * shares * prices[symbol][index]
-    return trades
+    in_range = (orders.index >= dt_start_date) & (orders.index <= dt_end_date)
+    for index in orders.index[~in_range]:
+        print 'Order out of date range:', index
+    return orders[in_range]
+
+
+def get_trades(orders, prices, start_date, end_date, costs=NO_COSTS):
+    '''Create trades DF from orders.
+
+    Orders are mapped to integer row and column positions of prices and
+    accumulated with scatter-adds, so there is no Python loop per order.
+    '''
+    orders = select_orders(orders, start_date, end_date)
+    rows, cols, shares = locate_orders(orders, prices)
+    cash = prices.columns.get_loc('Cash')
+    trades = np.zeros(prices.shape)
+    np.add.at(trades, (rows, cols), shares)
+    np.add.at(trades, (rows, cash),
+              get_cash_flows(shares, prices.values[rows, cols], costs))
+    return pd.DataFrame(trades, index=prices.index, columns=prices.columns)
+
+
+def locate_orders(orders, prices):
+    '''Map orders to row and column positions of prices and signed shares.'''
+    rows = TradingCalendar(prices.index).offsets(orders.index)
+    if (rows < 0).any():
+        raise KeyError(orders.index[rows < 0][0])  # not a trading day
+    cols = prices.columns.get_indexer(orders['Symbol'])
+    if (cols < 0).any():
+        raise KeyError(orders['Symbol'].values[cols < 0][0])
+    # Reverse trade operation for Sell orders
+    operator = np.where(orders['Order'].values == 'BUY', 1, -1)
+    return rows, cols, operator * orders['Shares'].values.astype(np.int64)
 
 
 def get_orders(orders_file):
-    '''Create orders dataframe from orders_file path.'''
-    orders = pd.read_csv(orders_file, index_col='Date', parse_dates=True)
+    '''Create orders dataframe from orders_file.
+
+    orders_file is a CSV file path, an orders dataframe indexed by date (as
+    from an engine's get_order_book) or a structured array with Date,
+    Symbol, Order and Shares fields. In-memory orders are not copied to disk.
+    '''
+    if isinstance(orders_file, np.ndarray):
+        orders = pd.DataFrame.from_records(orders_file, index='Date')
+    elif isinstance(orders_file, pd.DataFrame):
+        orders = orders_file.copy()
+    else:
+        orders = pd.read_csv(orders_file, index_col='Date', parse_dates=True)
+        orders.sort_index(inplace=True)
+        return orders
+    orders.index = pd.to_datetime(orders.index)
+    orders['Shares'] = orders['Shares'].astype(np.int64)
     orders.sort_index(inplace=True)
     return orders
 
 
 def get_prices(symbols, start_date, end_date):
     '''Create prices dataframe from symbols and start/end dates.'''
-    dates = pd.date_range(start_date, end_date)
+    dates = get_calendar().between(start_date, end_date)
     prices_all = get_data(symbols, dates)  # automatically adds SPY
     prices = prices_all[symbols]
     #prices['Cash'] = pd.Series(np.ones(len(prices)), index=prices.index)
@@ -116,10 +371,6 @@ def get_prices(symbols, start_date, end_date):
     return prices
 
 
-def clone_df(original, fill=0.0):
-    return pd.DataFrame(fill, index=original.index, columns=original.columns)
-
-
 def plot_comparision(portfolio, benchmark):
     df = portfolio.to_frame()
     df = df.join(benchmark)
@@ -0,0 +1,138 @@
+"""MC2-P2: Multi-symbol strategies."""
+
+import numpy as np
+import pandas as pd
+from util import get_data
+from order_log import OrderLog
+from indicators import ArrayRollingStd, ArrayTRIX
+
+
+class ArrayTradingEngine(object):
+    '''Trade recommendation engine for many symbols, one bar for all per call.
+
+    Indicator state and positions are arrays indexed like symbols.
+    Subclasses fill in add_data_point and get_recommendation.
+    '''
+
+    def __init__(self, symbols, long_limit=100, short_limit=-100):
+        self.symbols = np.asarray(symbols)
+        self.long_limit = long_limit
+        self.short_limit = short_limit
+        self.current_position = np.zeros(len(symbols), dtype=int)
+        self.current_date = None
+        self.recommendation_history = OrderLog()
+
+    def record(self, orders):
+        '''Apply this bar's signed share orders (one per symbol) and log them.'''
+        cols = np.flatnonzero(orders)
+        if len(cols):
+            self.current_position += orders
+            self.recommendation_history.extend(
+                self.current_date, self.symbols[cols], orders[cols])
+        return orders
+
+    def get_order_book(self):
+        '''Return recommended orders as an orders dataframe for compute_portvals.'''
+        return self.recommendation_history.to_frame()
+
+    def create_order_book(self, path):
+        self.recommendation_history.to_frame().to_csv(path, index_label='Date')
+
+
+class BollingerArrayEngine(ArrayTradingEngine):
+    '''Bollinger band entries and SMA exits, as BollingerTradingEngine, for many symbols.'''
+
+    def __init__(self, symbols, long_limit=100, short_limit=-100, window=20):
+        super(BollingerArrayEngine, self).__init__(symbols, long_limit, short_limit)
+        n = len(symbols)
+        self.window = window
+        self.bands = ArrayRollingStd(window, n)
+        self.current_price = np.empty(n)
+        self.current_price.fill(np.nan)
+        self.last_price = self.current_price.copy()
+        self.last_sma = self.current_price.copy()
+        self.last_std = self.current_price.copy()
+        self.updated = np.zeros(n, dtype=bool)
+
+    def add_data_point(self, date, prices):
+        prices = np.asarray(prices, dtype=np.float64)
+        self.current_date = date
+        self.updated = ~np.isnan(prices)
+        updated = self.updated
+        self.last_price[updated] = self.current_price[updated]
+        self.current_price[updated] = prices[updated]
+        self.last_sma[updated] = self.bands.mean[updated]
+        self.last_std[updated] = self.bands.value[updated]
+        self.bands.update(prices)
+
+    def get_recommendation(self):
+        '''Signed shares to trade in each symbol on the current bar.'''
+        last_price, current_price = self.last_price, self.current_price
+        last_sma, sma = self.last_sma, self.bands.mean
+        last_std, std = self.last_std, self.bands.value
+        position = self.current_position
+        with np.errstate(invalid='ignore'):
+            # Symbols need both bands, non-zero, and a price on this bar
+            ready = self.updated & ~np.isnan(last_sma) & (last_std != 0) & (std != 0)
+            long_entry = (last_price <= last_sma - 2 * last_std) & (current_price > sma - 2 * std)
+            short_entry = (last_price >= last_sma + 2 * last_std) & (current_price < sma + 2 * std)
+            above_sma = (last_price <= last_sma) & (current_price > sma)
+            below_sma = (last_price >= last_sma) & (current_price < sma)
+        buy = ready & long_entry & (position < self.long_limit)
+        sell = ready & ~buy & short_entry & (position > self.short_limit)
+        exit_long = ready & ~buy & ~sell & above_sma & (position >= self.long_limit)
+        exit_short = (ready & ~buy & ~sell & ~exit_long & below_sma &
+                      (position <= self.short_limit))
+        orders = np.where(buy | exit_short, self.long_limit,
+                          np.where(sell | exit_long, self.short_limit, 0))
+        return self.record(orders)
+
+
+class TRIXArrayEngine(ArrayTradingEngine):
+    '''TRIX sign reversals, as TRIXTradingEngine, for many symbols.'''
+
+    def __init__(self, symbols, long_limit=100, short_limit=-100,
+                 smoothing=3, period=15):
+        super(TRIXArrayEngine, self).__init__(symbols, long_limit, short_limit)
+        self.trix = ArrayTRIX(period, len(symbols), smoothing, 1)
+
+    def add_data_point(self, date, prices):
+        self.current_date = date
+        self.trix.update(prices)
+
+    def get_recommendation(self):
+        '''Signed shares to trade in each symbol on the current bar.'''
+        trix = self.trix.value
+        position = self.current_position
+        with np.errstate(invalid='ignore'):
+            buy = (trix > 0) & (position < self.long_limit)
+            sell = (trix < 0) & (position > self.short_limit)
+        orders = np.where(buy, self.long_limit - position,
+                          np.where(sell, self.short_limit - position, 0))
+        return self.record(orders)
+
+
+def run_multi(debug=False):
+    """Driver function."""
+    # Define input parameters
+    start_date = '2007-12-31'
+    end_date = '2009-12-31'
+    symbols = ['IBM', 'AAPL', 'GOOG', 'XOM', 'GLD']
+
+    dates = pd.date_range(start_date, end_date)
+    prices = get_data(symbols, dates)[symbols]  # automatically adds SPY
+
+    engines = [BollingerArrayEngine(symbols), TRIXArrayEngine(symbols)]
+    for date, row in zip(prices.index, prices.values):
+        for engine in engines:
+            engine.add_data_point(date, row)
+            orders = engine.get_recommendation()
+            if debug and orders.any():
+                print date, type(engine).__name__, orders
+    for engine in engines:
+        print type(engine).__name__
+        print engine.get_order_book()
+
+
+if __name__ == "__main__":
+    run_multi()
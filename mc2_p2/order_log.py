@@ -0,0 +1,72 @@
+"""MC2-P2: Log of recommended orders."""
+
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+Order = namedtuple('Order', ['date', 'symbol', 'order', 'shares'])
+
+
+class OrderLog(object):
+    '''Recommended orders kept in preallocated arrays that double when full.
+
+    Adding an order is O(1) amortized; a DataFrame is only built by to_frame.
+    '''
+
+    def __init__(self, capacity=64):
+        self.size = 0
+        self.dates = np.empty(capacity, dtype=object)
+        self.symbols = np.empty(capacity, dtype=object)
+        self.buys = np.empty(capacity, dtype=bool)
+        self.shares = np.empty(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield Order(self.dates[i], self.symbols[i],
+                        'BUY' if self.buys[i] else 'SELL', self.shares[i])
+
+    def reserve(self, count):
+        '''Make room for count more orders.'''
+        needed = self.size + count
+        if needed > len(self.shares):
+            capacity = max(needed, 2 * len(self.shares))
+            self.dates = np.resize(self.dates, capacity)
+            self.symbols = np.resize(self.symbols, capacity)
+            self.buys = np.resize(self.buys, capacity)
+            self.shares = np.resize(self.shares, capacity)
+
+    def add(self, date, symbol, order, shares):
+        '''Log one order ('BUY' or 'SELL') and return it.'''
+        self.reserve(1)
+        self.dates[self.size] = date
+        self.symbols[self.size] = symbol
+        self.buys[self.size] = order == 'BUY'
+        self.shares[self.size] = shares
+        self.size += 1
+        return Order(date, symbol, order, shares)
+
+    def extend(self, date, symbols, shares):
+        '''Log orders for several symbols on one date from signed share counts.'''
+        count = len(shares)
+        self.reserve(count)
+        end = self.size + count
+        self.dates[self.size:end] = [date] * count
+        self.symbols[self.size:end] = symbols
+        self.buys[self.size:end] = shares > 0
+        self.shares[self.size:end] = np.abs(shares)
+        self.size = end
+
+    def to_frame(self):
+        '''Orders as a DataFrame with Symbol, Order and Shares columns by Date.'''
+        size = self.size
+        orders = pd.DataFrame({
+            'Symbol': self.symbols[:size],
+            'Order': np.where(self.buys[:size], 'BUY', 'SELL'),
+            'Shares': self.shares[:size],
+        }, index=pd.to_datetime(list(self.dates[:size])),
+            columns=['Symbol', 'Order', 'Shares'])
+        orders.index.name = 'Date'
+        return orders
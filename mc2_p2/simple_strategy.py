@@ -1,83 +1,11 @@
 """MC2-P2: simple Strategy."""
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from util import get_data
-import collections
-import numpy as np
-
-
-class EMA(object):
-
-    def __init__(self, periods):
-        self.periods = periods
-        self.history = []
-        self.ema = np.nan
-        self.multiplier = (2.0 / (periods + 1))
-
-    def update(self, value):
-        #print value, self.history, self.ema
-        if value is None or value is np.nan:
-            # invalid value
-            pass
-        elif self.ema is not np.nan:
-            # update ema
-            self.ema += (value - self.ema) * self.multiplier
-        elif len(self.history) < self.periods - 1:
-            # not enough data yet
-            self.history.append(value)
-        elif len(self.history) == self.periods - 1:
-            # set ema to sma
-            self.history.append(value)
-            self.ema = np.mean(self.history)
-        return self.ema
-
-    @property
-    def value(self):
-        return self.ema
-
-
-class ROC(object):
-
-    def __init__(self, periods):
-        self.history = collections.deque([], periods + 1)
-        self.value = np.nan
-
-    def update(self, value):
-        if value and value is not np.nan:
-            self.history.append(value)
-            self.value = (self.history[-1] / self.history[0]) - 1
-        return self.value
-
-
-class SMA(object):
-
-    def __init__(self, periods):
-        self.history = collections.deque([], periods + 1)
-        self.value = np.nan
-
-    def update(self, value):
-        if value and value is not np.nan:
-            self.history.append(value)
-        if len(self.history) == self.history.maxlen:
-            self.value = np.mean(self.history)
-        return self.value
-
-
-class EMAROC(object):
-
-    def __init__(self, ema_factor=1, ema_period=15, roc_period=1):
-        self.ema_list = [EMA(ema_period) for _ in range(ema_factor)]
-        self.roc = ROC(roc_period)
-
-    def update(self, value):
-        for ema in self.ema_list:
-            value = ema.update(value)
-        return self.roc.update(value)
-
-    @property
-    def value(self):
-        return self.roc.value
+from order_log import OrderLog
+from indicators import SMA, TRIX
 
 
 class simpleTradingEngine(object):
@@ -89,26 +17,29 @@ class simpleTradingEngine(object):
         self.long_limit = long_limit
         self.short_limit = short_limit
         self.current_position = 0
-        self.history = pd.DataFrame(
-            columns=[self.symbol, 'simple', 'EMA(9)'])
-        self.simple = EMAROC(1, 20, 1)
+        # Rows of (date, price, simple, signal), turned into a frame on demand
+        self.rows = []
+        # ROC of a single 20 day EMA
+        self.simple = TRIX(20, smoothing=1, roc_periods=1)
         self.signal = SMA(9)
         self.last_simple = self.simple.value
         self.last_signal = self.signal.value
-        self.recommendation_history = pd.DataFrame(
-            columns=['Symbol', 'Order', 'Shares'])
+        self.current_date = None
+        self.recommendation_history = OrderLog()
+
+    @property
+    def history(self):
+        '''Prices and indicator values seen so far, as a dataframe.'''
+        columns = ['Date', self.symbol, 'simple', 'EMA(9)']
+        return pd.DataFrame(self.rows, columns=columns).set_index('Date')
 
     def add_data_point(self, date, price):
         self.last_simple = self.simple.value
         self.last_signal = self.signal.value
         self.simple.update(price)
         self.signal.update(self.simple.value)
-        df = pd.DataFrame(
-            [[price, self.simple.value, self.signal.value]],
-            columns=[self.symbol, 'simple', 'EMA(9)'],
-            index=[date]
-        )
-        self.history = self.history.append(df)
+        self.current_date = date
+        self.rows.append((date, price, self.simple.value, self.signal.value))
 
     def get_recommendation(self):
         '''Recommend whether to buy, sell, or hold.'''
@@ -119,14 +50,8 @@ class simpleTradingEngine(object):
         def buy():
             amount = self.long_limit - self.current_position
             self.current_position = self.long_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'BUY', amount]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'BUY', amount)
 
         def can_sell():
             return self.current_position > self.short_limit
@@ -134,17 +59,11 @@ class simpleTradingEngine(object):
         def sell():
             amount = self.current_position - self.short_limit
             self.current_position = self.short_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'SELL', amount]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'SELL', amount)
 
         def not_enough_data():
-            return self.simple.value is np.nan
+            return np.isnan(self.simple.value)
 
         def is_rising():
             return self.simple.value > 0 and self.last_simple <= 0
@@ -162,7 +81,7 @@ class simpleTradingEngine(object):
 
         if not_enough_data():
             return None
-        current_date = self.history.index[-1]
+        current_date = self.current_date
         print current_date, is_rising(), is_falling(), self.current_position
         if is_rising() and can_buy():
             buy()
@@ -171,28 +90,32 @@ class simpleTradingEngine(object):
         return None
 
     def stats(self):
-        return self.ema_list, self.roc, self.history.size, self.simple, self.signal
+        return self.simple.value, self.signal.value, len(self.rows), self.current_position
 
     def plot(self, title='', xlabel="Date", ylabel="Price"):
         """Plot stock prices with a custom title and meaningful axis labels."""
         #print self.history[['simple', 'EMA(9)']].applymap(np.isreal)
         #print self.history[['simple', 'EMA(9)']].tail()
         fig, (ax1, ax2) = plt.subplots(2, 1, sharex=True)
-        self.history[self.symbol].plot(ax=ax1)
-        df = self.history.loc[:, ['simple', 'EMA(9)']]
+        history = self.history
+        history[self.symbol].plot(ax=ax1)
+        df = history.loc[:, ['simple', 'EMA(9)']]
         df.plot(ax=ax2)
         ax1.set_xlabel("Date")
         ax1.set_ylabel("Price")
-        for date, recommendation in self.recommendation_history.iterrows():
-            color = 'g' if recommendation.ix['Order'] == 'BUY' else 'r'
+        for date, symbol, order, shares in self.recommendation_history:
+            color = 'g' if order == 'BUY' else 'r'
             ax1.axvline(x=date, color=color)
             ax2.axvline(x=date, color=color)
         ax1.legend(loc=3)
         plt.show()
 
+    def get_order_book(self):
+        '''Return recommended orders as an orders dataframe for compute_portvals.'''
+        return self.recommendation_history.to_frame()
+
     def create_order_book(self, path):
-        self.recommendation_history.to_csv(
-            path, columns=['Symbol', 'Order', 'Shares'], index_label='Date')
+        self.recommendation_history.to_frame().to_csv(path, index_label='Date')
 
 
 def run_simple(debug=False):
@@ -220,7 +143,7 @@ def run_simple(debug=False):
 
 
 def test():
-    d = EMAROC(1, 5, 1)
+    d = TRIX(5, smoothing=1, roc_periods=1)
     for i in range(20):
         print d.update(i)
 
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from blah_strategy import BollingerTradingEngine
+
+
+def baseline_orders(prices, signal, window=20, threshold=0.5):
+    '''Signal crossings as the engine first found them, from pandas rolling bands.'''
+    def percent_b(series):
+        sma = series.rolling(window).mean()
+        std = series.rolling(window).std()
+        return (series - (sma - 2 * std)) / (4 * std)
+
+    gap = (percent_b(prices) - percent_b(signal)).values
+    position, orders = 0, []
+    for t in range(window, len(gap)):
+        crossed = abs(gap[t - 1]) <= threshold and abs(gap[t]) > threshold
+        if crossed and gap[t] > 0 and position > -100:
+            position -= 100
+            orders.append((prices.index[t], 'SELL'))
+        elif crossed and gap[t] < 0 and position < 100:
+            position += 100
+            orders.append((prices.index[t], 'BUY'))
+    return orders
+
+
+def test_engine_matches_rolling_bands():
+    rng = np.random.RandomState(0)
+    dates = pd.bdate_range('2005-01-03', periods=500)
+    walks = np.round(50 * np.exp(np.cumsum(rng.randn(500, 2) * 0.02, axis=0)), 2)
+    prices, signal = pd.Series(walks[:, 0], dates), pd.Series(walks[:, 1], dates)
+    for threshold in (0.1, 0.5):
+        engine = BollingerTradingEngine('IBM', long_limit=100, short_limit=-100,
+                                        threshold=threshold)
+        for date in dates:
+            engine.add_data_point(date, prices[date], signal[date])
+            engine.get_recommendation()
+        book = engine.get_order_book()
+        expected = baseline_orders(prices, signal, threshold=threshold)
+        assert len(expected) > 10
+        assert list(zip(book.index, book['Order'])) == expected
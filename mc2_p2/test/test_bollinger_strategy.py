@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from bollinger_strategy import BollingerTradingEngine, get_bands, run_batch
+
+
+def random_prices(days=500, symbols=4, seed=0):
+    '''Random walk prices rounded to cents, so that band ties do happen.'''
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('2005-01-03', periods=days)
+    values = np.round(50 * np.exp(np.cumsum(rng.randn(days, symbols) * 0.02, axis=0)), 2)
+    return pd.DataFrame(values, index=dates,
+                        columns=['SYM{}'.format(i) for i in range(symbols)])
+
+
+def run_engine(prices, window=20):
+    engine = BollingerTradingEngine(prices.name, long_limit=100, short_limit=-100,
+                                    window=window)
+    for date, price in prices.iteritems():
+        engine.add_data_point(date, price)
+        engine.get_recommendation()
+    return engine.get_order_book()
+
+
+def test_engine_skips_missing_prices():
+    prices = random_prices(symbols=1)['SYM0']
+    expected = run_engine(prices[100:])
+    assert len(expected) > 0
+    prices[:100] = np.nan
+    pd.testing.assert_frame_equal(run_engine(prices), expected)
+
+
+def gappy_prices():
+    prices = random_prices(days=1000, symbols=20, seed=1)
+    rng = np.random.RandomState(2)
+    for i, symbol in enumerate(prices.columns):
+        prices.iloc[:rng.randint(0, 200), i] = np.nan  # listed late
+        prices.iloc[rng.randint(0, 1000, 10), i] = np.nan  # missing days
+    return prices
+
+
+def test_get_bands_match_engine():
+    prices = gappy_prices()
+    sma, std = get_bands(prices.values)
+    for i, symbol in enumerate(prices.columns):
+        engine = BollingerTradingEngine(symbol)
+        for t, price in enumerate(prices[symbol]):
+            engine.add_data_point(prices.index[t], price)
+            # Exact equality, so that price/band ties resolve the same way
+            np.testing.assert_array_equal([sma[t, i], std[t, i]], [engine.sma, engine.std])
+
+
+def test_run_batch_matches_engines():
+    prices = gappy_prices()
+    books = [run_engine(prices[symbol]) for symbol in prices.columns]
+    expected = pd.concat(books, keys=range(len(books)), names=['Column', 'Date'])
+    expected = expected.swaplevel().sort_index().reset_index('Column', drop=True)
+    actual = run_batch(prices)
+    assert len(actual) > 1000
+    pd.testing.assert_frame_equal(actual, expected)
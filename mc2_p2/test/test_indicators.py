@@ -0,0 +1,76 @@
+import numpy as np
+
+import indicators
+
+
+def gappy_values(days=300, series=6, seed=0):
+    '''Random walks, each listed late and missing some days; one never listed.'''
+    rng = np.random.RandomState(seed)
+    values = 50 * np.exp(np.cumsum(rng.randn(days, series) * 0.02, axis=0))
+    for i in range(series - 1):
+        values[:rng.randint(0, 60), i] = np.nan
+        values[rng.randint(0, days, 20), i] = np.nan
+    values[:, -1] = np.nan
+    return values
+
+
+def stream(indicator, values):
+    '''What indicator.update returns after each value.'''
+    return np.array([indicator.update(value) for value in values])
+
+
+def check_matches_stream(get, make, values):
+    actual = get(values)
+    expected = np.column_stack([stream(make(), column) for column in values.T])
+    assert np.isnan(actual).sum() < actual.size - len(values)
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=1e-9)
+    # One series at a time, as well as columns of a 2-D array
+    np.testing.assert_allclose(get(values[:, 0]), expected[:, 0], rtol=1e-9)
+
+
+def test_get_functions_match_streaming_classes():
+    values = gappy_values()
+    check_matches_stream(lambda v: indicators.get_sma(v, 20),
+                         lambda: indicators.SMA(20), values)
+    check_matches_stream(lambda v: indicators.get_rolling_std(v, 20),
+                         lambda: indicators.RollingStd(20), values)
+    check_matches_stream(lambda v: indicators.get_ema(v, 15),
+                         lambda: indicators.EMA(15), values)
+    check_matches_stream(lambda v: indicators.get_roc(v, 5),
+                         lambda: indicators.ROC(5), values)
+    check_matches_stream(lambda v: indicators.get_trix(v, 15),
+                         lambda: indicators.TRIX(15), values)
+    check_matches_stream(lambda v: indicators.get_percent_b(v, 20),
+                         lambda: indicators.PercentB(20), values)
+
+
+def test_get_functions_on_short_series():
+    values = gappy_values(days=10, series=2)
+    for get, make in [(indicators.get_sma, indicators.SMA),
+                      (indicators.get_ema, indicators.EMA)]:
+        expected = np.column_stack([stream(make(20), column) for column in values.T])
+        np.testing.assert_array_equal(get(values, 20), expected)
+
+
+def test_array_classes_match_streaming_classes():
+    values = gappy_values()
+    n = values.shape[1]
+    pairs = [(indicators.ArraySMA(20, n), indicators.SMA, (20,)),
+             (indicators.ArrayRollingStd(20, n), indicators.RollingStd, (20,)),
+             (indicators.ArrayEMA(15, n), indicators.EMA, (15,)),
+             (indicators.ArrayROC(5, n), indicators.ROC, (5,)),
+             (indicators.ArrayTRIX(15, n), indicators.TRIX, (15,))]
+    for array, make, args in pairs:
+        actual = np.array([array.update(row).copy() for row in values])
+        expected = np.column_stack([stream(make(*args), column) for column in values.T])
+        # Bit for bit, so that strategies on either resolve ties the same way
+        np.testing.assert_array_equal(actual, expected)
+
+    bands = indicators.ArrayRollingStd(20, n)
+    singles = [indicators.RollingStd(20) for _ in range(n)]
+    for row in values:
+        bands.update(row)
+        for single, value in zip(singles, row):
+            single.update(value)
+        np.testing.assert_array_equal(bands.mean, [single.mean for single in singles])
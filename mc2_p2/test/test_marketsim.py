@@ -0,0 +1,187 @@
+import os
+import numpy as np
+import pandas as pd
+
+import marketsim
+
+ORDERS_DIR = os.path.join(os.path.dirname(__file__), '..', 'orders')
+START_VAL = 1000000
+LEVELS = {'AAPL': 340.0, 'GOOG': 600.0, 'IBM': 160.0, 'XOM': 80.0}
+
+
+def answer_dates():
+    '''Trading days of the leverageTest answer files.'''
+    ans = pd.read_csv(os.path.join(ORDERS_DIR, 'leverageTest1_ans.csv'),
+                      header=None, index_col=0, parse_dates=True)
+    return ans.index
+
+
+def random_prices(dates, symbols, seed=0):
+    '''Random walk prices around each symbol's level, with a Cash column.'''
+    rng = np.random.RandomState(seed)
+    walks = np.exp(np.cumsum(rng.randn(len(dates), len(symbols)) * 0.02, axis=0))
+    prices = pd.DataFrame(np.round(walks * [LEVELS[s] for s in symbols], 2),
+                          index=dates, columns=symbols)
+    prices['Cash'] = 1.0
+    return prices
+
+
+def random_orders(dates, symbols, n_orders, seed=0):
+    '''Random BUY/SELL orders on dates and symbols, sorted by date.'''
+    rng = np.random.RandomState(seed)
+    orders = pd.DataFrame({
+        'Symbol': np.array(symbols)[rng.randint(len(symbols), size=n_orders)],
+        'Order': np.array(['BUY', 'SELL'])[rng.randint(2, size=n_orders)],
+        'Shares': rng.randint(1, 50, size=n_orders) * 100,
+    }, index=dates[rng.randint(len(dates), size=n_orders)])
+    return orders.sort_index()
+
+
+def baseline_trades(orders, prices, start_date, end_date):
+    '''Trades as get_trades first built them, one order at a time.'''
+    trades = pd.DataFrame(0.0, index=prices.index, columns=prices.columns)
+    for date, row in orders.iterrows():
+        if date < pd.to_datetime(start_date) or date > pd.to_datetime(end_date):
+            continue
+        operator = 1 if row['Order'] == 'BUY' else -1
+        trades.loc[date, row['Symbol']] += operator * row['Shares']
+        trades.loc[date, 'Cash'] -= operator * row['Shares'] * prices.loc[date, row['Symbol']]
+    return trades
+
+
+def baseline_portvals(orders, prices, start_val):
+    '''The leverage rule as compute_portvals first implemented it.
+
+    Holdings are recomputed over the whole history and the first offending
+    trade day zeroed out until no day raises leverage above 2.0.
+    Returns the daily values and the number of rejected days.
+    '''
+    trades = pd.DataFrame(0.0, index=prices.index, columns=prices.columns)
+    for date, row in orders.iterrows():
+        operator = 1 if row['Order'] == 'BUY' else -1
+        trades.loc[date, row['Symbol']] += operator * row['Shares']
+        trades.loc[date, 'Cash'] -= operator * row['Shares'] * prices.loc[date, row['Symbol']]
+    rejected = 0
+    while True:
+        holdings = trades.copy()
+        holdings.iloc[0, holdings.columns.get_loc('Cash')] += start_val
+        values = holdings.cumsum() * prices
+        stocks = values.drop(['Cash'], axis=1)
+        leverage = stocks.abs().sum(axis=1) / (stocks.sum(axis=1) + values['Cash'])
+        delta = leverage.diff()
+        over = (leverage[leverage > 2.0].index & delta[delta > 0.0].index &
+                trades[trades != 0.0].dropna(how='all').index)
+        if len(over) == 0:
+            return values.sum(axis=1), rejected
+        trades.loc[over[0]] = 0.0
+        rejected += 1
+
+
+def test_get_trades_matches_baseline():
+    dates = answer_dates()
+    prices = random_prices(dates, sorted(LEVELS))
+    # Many orders share a day and symbol; some fall outside the range
+    orders = random_orders(dates, sorted(LEVELS), 500)
+    start_date, end_date = dates[20], dates[-20]
+    trades = marketsim.get_trades(orders, prices.loc[start_date:end_date],
+                                  start_date, end_date)
+    expected = baseline_trades(orders, prices, start_date, end_date)
+    assert len(orders.loc[start_date:end_date]) < len(orders)
+    pd.testing.assert_frame_equal(trades, expected.loc[start_date:end_date])
+
+
+def test_leverage_matches_baseline():
+    dates = answer_dates()
+    for i in (1, 2, 3):
+        orders = marketsim.get_orders(os.path.join(ORDERS_DIR, 'leverageTest{}.csv'.format(i)))
+        prices = random_prices(dates, sorted(orders['Symbol'].unique()), seed=i)
+        expected, rejected = baseline_portvals(orders, prices, START_VAL)
+        assert rejected > 0
+        portvals = marketsim.compute_portvals_batch([orders], prices, START_VAL)
+        np.testing.assert_allclose(portvals[:, 0], expected.values, rtol=1e-12)
+
+
+def test_unpriced_symbols_not_held():
+    dates = answer_dates()[:60]
+    prices = random_prices(dates, ['GOOG', 'IBM'])
+    prices.iloc[:20, 0] = np.nan  # GOOG not listed yet
+    orders = pd.DataFrame({'Symbol': ['GOOG', 'GOOG', 'IBM'],
+                           'Order': ['BUY', 'SELL', 'BUY'],
+                           'Shares': [100, 100, 20000]},
+                          index=dates[[30, 40, 10]]).sort_index()
+    portvals = marketsim.compute_portvals_batch([orders], prices, START_VAL)[:, 0]
+    assert not np.isnan(portvals).any()
+    # The IBM buy, at leverage above 2.0 on a day GOOG has no price, is rejected
+    expected, rejected = baseline_portvals(orders, prices.fillna(0.0), START_VAL)
+    assert rejected == 1
+    np.testing.assert_allclose(portvals, expected.values, rtol=1e-12)
+
+
+def test_transaction_costs():
+    costs = marketsim.TransactionCosts(commission=10.0, per_share=0.01,
+                                       slippage=0.001, impact=1e-5)
+    # Buy fills at 50 * (1 + 0.001 + 100e-5), sell at 20 * (1 - 0.001 - 200e-5)
+    flows = marketsim.get_cash_flows(np.array([100, -200, 0]),
+                                     np.array([50.0, 20.0, 30.0]), costs)
+    np.testing.assert_allclose(flows, [-100 * 50.1 - 11, 200 * 19.94 - 12, 0])
+    assert np.isclose(marketsim.get_cash_flows(100, 50.0, costs), flows[0])
+
+    dates = answer_dates()[:10]
+    prices = random_prices(dates, ['IBM'])
+    orders = pd.DataFrame({'Symbol': ['IBM'], 'Order': ['BUY'], 'Shares': [100]},
+                          index=dates[[3]])
+    portvals = marketsim.compute_portvals_batch([orders], prices, START_VAL, costs=costs)
+    price = prices['IBM'].values
+    expected = START_VAL + 100 * (price - price[3] * 1.002) - 11
+    np.testing.assert_allclose(portvals[3:, 0], expected[3:])
+
+
+def test_compute_portvals_batch_books():
+    dates = answer_dates()
+    prices = random_prices(dates, sorted(LEVELS))
+    empty = random_orders(dates, ['IBM'], 0)
+    books = [random_orders(dates, ['AAPL', 'IBM'], 30, seed=1), empty,
+             random_orders(dates, ['GOOG', 'XOM'], 30, seed=2),
+             random_orders(dates, sorted(LEVELS), 60, seed=3)]
+    singles = np.column_stack([
+        marketsim.compute_portvals_batch([book], prices, START_VAL)[:, 0]
+        for book in books])
+    np.testing.assert_array_equal(singles[:, 1], START_VAL)
+    portvals = marketsim.compute_portvals_batch(books, prices, START_VAL)
+    np.testing.assert_allclose(portvals, singles, rtol=1e-12)
+    stacked = pd.concat([book.assign(Book=i) for i, book in enumerate(books)])
+    portvals = marketsim.compute_portvals_batch(stacked, prices, START_VAL)
+    np.testing.assert_allclose(portvals, singles, rtol=1e-12)
+
+
+def test_get_orders_in_memory():
+    path = os.path.join(ORDERS_DIR, 'orders.csv')
+    expected = marketsim.get_orders(path)
+    df = pd.read_csv(path, parse_dates=['Date'])
+    pd.testing.assert_frame_equal(marketsim.get_orders(df.set_index('Date')), expected)
+    records = df.to_records(index=False)
+    pd.testing.assert_frame_equal(marketsim.get_orders(records), expected)
+
+
+def test_streaming_replay_matches_batch(tmpdir):
+    dates = pd.bdate_range('2011-01-03', '2011-12-30')
+    path = str(tmpdir.join('sim.pkl'))
+    for name in ('orders.csv', 'orders2.csv', 'leverage.csv', 'leverageTest1.csv'):
+        orders = marketsim.get_orders(os.path.join(ORDERS_DIR, name))
+        prices = random_prices(dates, sorted(LEVELS), seed=len(orders))
+        sim = marketsim.StreamingSimulator(START_VAL)
+        for t, date in enumerate(dates):
+            for _, row in orders.loc[date:date].iterrows():
+                sim.on_order(row)
+            sim.on_bar(date, prices.loc[date])
+            if t == len(dates) // 2:
+                sim.checkpoint(path)
+                sim = marketsim.StreamingSimulator.restore(path)
+        expected = marketsim.compute_portvals_batch([orders], prices, START_VAL)[:, 0]
+        assert sim.get_portvals().index.equals(dates)
+        np.testing.assert_allclose(sim.get_portvals().values, expected, rtol=1e-12)
+
+    sim = marketsim.StreamingSimulator(START_VAL, history_size=5)
+    for date in dates[:20]:
+        sim.on_bar(date, prices.loc[date])
+    assert sim.get_portvals().index.equals(dates[15:20])
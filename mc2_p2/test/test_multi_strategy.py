@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from bollinger_strategy import BollingerTradingEngine, run_batch
+from multi_strategy import BollingerArrayEngine, TRIXArrayEngine
+from trix_strategy import TRIXTradingEngine
+
+
+def gappy_prices(days=400, symbols=8, seed=1):
+    '''Random walk prices rounded to cents, listed late and missing some days.'''
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('2005-01-03', periods=days)
+    values = np.round(50 * np.exp(np.cumsum(rng.randn(days, symbols) * 0.02, axis=0)), 2)
+    prices = pd.DataFrame(values, index=dates,
+                          columns=['SYM{}'.format(i) for i in range(symbols)])
+    for i in range(symbols):
+        prices.iloc[:rng.randint(0, 80), i] = np.nan
+        prices.iloc[rng.randint(0, days, 10), i] = np.nan
+    return prices
+
+
+def run_array_engine(engine, prices):
+    for date, row in zip(prices.index, prices.values):
+        engine.add_data_point(date, row)
+        engine.get_recommendation()
+    return engine.get_order_book()
+
+
+def run_engines(make_engine, prices):
+    '''Per-symbol order books, merged by date and then by column.'''
+    books = []
+    for symbol in prices.columns:
+        engine = make_engine(symbol)
+        for date, price in prices[symbol].iteritems():
+            engine.add_data_point(date, price)
+            engine.get_recommendation()
+        books.append(engine.get_order_book())
+    merged = pd.concat(books, keys=range(len(books)), names=['Column', 'Date'])
+    return merged.swaplevel().sort_index().reset_index('Column', drop=True)
+
+
+def test_bollinger_array_engine():
+    prices = gappy_prices()
+    book = run_array_engine(BollingerArrayEngine(prices.columns), prices)
+    assert len(book) > 100
+    pd.testing.assert_frame_equal(book, run_batch(prices))
+    expected = run_engines(
+        lambda symbol: BollingerTradingEngine(symbol, long_limit=100, short_limit=-100),
+        prices)
+    pd.testing.assert_frame_equal(book, expected)
+
+
+def test_trix_array_engine():
+    prices = gappy_prices()
+    book = run_array_engine(TRIXArrayEngine(prices.columns), prices)
+    assert len(book) > 50
+    expected = run_engines(
+        lambda symbol: TRIXTradingEngine(symbol, long_limit=100, short_limit=-100),
+        prices)
+    pd.testing.assert_frame_equal(book, expected)
@@ -0,0 +1,175 @@
+import os
+import numpy as np
+import pandas as pd
+
+import util
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Adj Close']
+
+
+def write_csv(base_dir, symbol, dates, seed=0):
+    '''Write a Yahoo format CSV of random prices for symbol, newest date first.'''
+    rng = np.random.RandomState(seed)
+    close = np.round(50 * np.exp(np.cumsum(rng.randn(len(dates)) * 0.02)), 2)
+    df = pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1,
+                       'Close': close, 'Adj Close': close,
+                       'Volume': rng.randint(1000, 10000, len(dates))},
+                      index=pd.DatetimeIndex(dates, name='Date'))
+    df.iloc[::-1].to_csv(util.symbol_to_path(symbol, base_dir), columns=FIELDS)
+    return df
+
+
+def write_universe(base_dir):
+    '''SPY on business days, IBM with an extra Saturday, GOOG from mid range.'''
+    dates = pd.bdate_range('2010-01-01', '2010-03-31')
+    write_csv(base_dir, 'SPY', dates, seed=0)
+    write_csv(base_dir, 'IBM', dates.union([pd.Timestamp('2010-01-16')]), seed=1)
+    write_csv(base_dir, 'GOOG', dates[20:], seed=2)
+    return dates
+
+
+def load(symbols, dates, base_dir, **kwargs):
+    util.price_cache.clear()
+    return util.get_data(symbols, dates, base_dir=base_dir, **kwargs)
+
+
+def test_store_matches_csv(tmpdir):
+    base_dir = str(tmpdir)
+    write_universe(base_dir)
+    dates = pd.date_range('2010-01-10', '2010-02-20')
+    from_csv = load(['IBM', 'GOOG'], dates, base_dir)
+    util.ingest(base_dir)
+    from_store = load(['IBM', 'GOOG'], dates, base_dir)
+    assert list(from_store.columns) == ['SPY', 'IBM', 'GOOG']
+    assert pd.Timestamp('2010-01-16') not in from_store.index
+    pd.testing.assert_frame_equal(from_store, from_csv)
+
+
+def is_mapped(values):
+    '''Whether values views a memory-mapped file.'''
+    while values is not None:
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+def test_get_data_views_store(tmpdir):
+    base_dir = str(tmpdir)
+    write_universe(base_dir)
+    util.ingest(base_dir)
+    dates = pd.date_range('2010-02-01', '2010-03-31')
+    assert is_mapped(load(['IBM'], dates, base_dir).values)
+    assert is_mapped(load(['GOOG'], dates, base_dir).values)
+    df = load(['IBM', 'GOOG'], dates, base_dir)
+    pd.testing.assert_frame_equal(df[['SPY', 'GOOG']], load(['GOOG'], dates, base_dir))
+
+
+def test_store_frames_are_private(tmpdir):
+    base_dir = str(tmpdir)
+    write_universe(base_dir)
+    util.ingest(base_dir)
+    dates = pd.date_range('2010-02-01', '2010-03-31')
+    expected = load(['IBM'], dates, base_dir).copy()
+    df = load(['IBM'], dates, base_dir)
+    df.iloc[0, 1] = -1.0
+    pd.testing.assert_frame_equal(load(['IBM'], dates, base_dir), expected)
+    multi = load(['IBM'], dates, base_dir, fields=['Adj Close', 'Volume'])
+    pd.testing.assert_frame_equal(multi['Adj Close'], expected)
+    stored = np.load(util.store_to_path('Adj Close', base_dir))
+    assert (stored != -1.0).all()
+
+
+def test_no_trading_days(tmpdir):
+    base_dir = str(tmpdir)
+    write_universe(base_dir)
+    weekend = pd.date_range('2010-01-02', '2010-01-03')
+    df = load(['IBM'], weekend, base_dir)
+    assert df.shape == (0, 2)
+    assert list(df.columns) == ['SPY', 'IBM']
+    assert load(['IBM'], weekend, base_dir, fields=['Volume']).shape == (0, 2)
+    util.ingest(base_dir)
+    pd.testing.assert_frame_equal(load(['IBM'], weekend, base_dir), df)
+
+
+def test_multi_field(tmpdir):
+    base_dir = str(tmpdir)
+    write_universe(base_dir)
+    dates = pd.date_range('2010-01-01', '2010-03-31')
+    fields = ['Adj Close', 'Volume']
+    from_csv = load(['IBM'], dates, base_dir, fields=fields)
+    assert list(from_csv['Volume'].columns) == ['SPY', 'IBM']
+    pd.testing.assert_frame_equal(from_csv['Adj Close'], load(['IBM'], dates, base_dir))
+    util.ingest(base_dir)
+    from_store = load(['IBM'], dates, base_dir, fields=fields)
+    pd.testing.assert_frame_equal(from_store, from_csv, check_dtype=False)
+
+
+def test_stale_store_falls_back_to_csv(tmpdir):
+    base_dir = str(tmpdir)
+    dates = write_universe(base_dir)
+    util.ingest(base_dir)
+    fresh = write_csv(base_dir, 'IBM', dates, seed=3)
+    future = os.path.getmtime(util.store_to_path('Adj Close', base_dir)) + 10
+    os.utime(util.symbol_to_path('IBM', base_dir), (future, future))
+    assert not util.open_store(base_dir).is_fresh('IBM')
+    df = load(['IBM'], dates, base_dir)
+    np.testing.assert_array_equal(df['IBM'].values, fresh['Adj Close'].values)
+
+
+def test_reingest_keeps_mapped_matrix(tmpdir):
+    base_dir = str(tmpdir)
+    dates = write_universe(base_dir)
+    util.ingest(base_dir)
+    store = util.open_store(base_dir)
+    mapped = store.matrix()
+    before = np.array(mapped)
+    write_csv(base_dir, 'SPY', dates, seed=4)
+    util.ingest(base_dir)
+    np.testing.assert_array_equal(mapped, before)
+    np.testing.assert_array_equal(store.matrix(), before)
+    assert not np.array_equal(util.open_store(base_dir).matrix(), before)
+    assert sorted(os.listdir(os.path.join(base_dir, util.STORE_DIR))) == sorted(
+        ['calendar.npy', 'dates.npy', 'symbols.npy'] + [f + '.npy' for f in FIELDS])
+
+
+def test_ingest_some_fields(tmpdir):
+    base_dir = str(tmpdir)
+    dates = write_universe(base_dir)
+    util.ingest(base_dir)
+    write_csv(base_dir, 'AAPL', dates, seed=5)
+    util.ingest(base_dir, fields=['Volume'])
+    assert sorted(os.listdir(os.path.join(base_dir, util.STORE_DIR))) == [
+        'Volume.npy', 'calendar.npy', 'dates.npy', 'symbols.npy']
+    store = util.open_store(base_dir)
+    assert store.symbols == ['SPY', 'AAPL', 'GOOG', 'IBM']
+    assert store.is_fresh('IBM', 'Volume') and not store.is_fresh('IBM')
+    from_store = load(['AAPL', 'IBM'], dates, base_dir, fields=['Volume'])
+    adj_close = load(['AAPL', 'IBM'], dates, base_dir)  # from CSV
+    os.remove(util.store_to_path('dates', base_dir))
+    from_csv = load(['AAPL', 'IBM'], dates, base_dir, fields=['Volume'])
+    pd.testing.assert_frame_equal(from_store, from_csv, check_dtype=False)
+    pd.testing.assert_frame_equal(adj_close, load(['AAPL', 'IBM'], dates, base_dir))
+
+
+def test_trading_calendar(tmpdir):
+    base_dir = str(tmpdir)
+    dates = write_universe(base_dir)
+    calendar = util.get_calendar(base_dir)
+    assert os.path.exists(util.store_to_path('calendar', base_dir))
+    assert calendar.dates.equals(dates)
+    assert calendar.locate('2010-01-02', '2010-01-08') == (1, 6)
+    assert calendar.index(pd.date_range('2010-01-14', '2010-01-18')).equals(
+        pd.DatetimeIndex(['2010-01-14', '2010-01-15', '2010-01-18']))
+    offsets = calendar.offsets(['2010-01-01', '2010-01-02', '2010-01-04'])
+    np.testing.assert_array_equal(offsets, [0, -1, 1])
+    assert len(calendar.index([])) == 0
+    assert len(calendar.index(pd.date_range('2010-01-02', '2010-01-03'))) == 0
+
+
+def test_mc3_p2_copy_in_sync():
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, '..', 'util.py')) as f:
+        shared = f.read()
+    with open(os.path.join(here, '..', '..', 'mc3_p2', 'util.py')) as f:
+        assert f.read() == shared, 'copy mc2_p2/util.py to mc3_p2/util.py'
@@ -1,17 +1,18 @@
 import scipy.optimize as spo
 from portfolio.analysis import get_portfolio_stats
-from marketsim import compute_portvals
+from marketsim import compute_portvals, NO_COSTS
 from trix_strategy import TRIXTradingEngine
 from util import get_data
 import pandas as pd
 
 
-def find_optimal():
+def find_optimal(costs=NO_COSTS):
     """Find optimal allocations for a stock portfolio, optimizing for Sharpe ratio.
 
     Parameters
     ----------
-        prices: daily prices for each stock in portfolio
+        costs: TransactionCosts charged on every backtest fill (default: none),
+            so that high-turnover parameters are not favored for free
 
     Returns
     -------
@@ -29,8 +30,9 @@ def find_optimal():
         for date, row in prices.iterrows():
             engine.add_data_point(date, row['IBM'])
             engine.get_recommendation()
-        engine.create_order_book(orders_file)
-        portvals = compute_portvals(start_date, end_date, orders_file, start_val)
+        portvals = compute_portvals(start_date, end_date,
+                                    engine.get_order_book(), start_val,
+                                    costs=costs)
         cum_ret, _, _, _ = get_portfolio_stats(portvals)
         return -cum_ret
 
@@ -39,7 +41,6 @@ def find_optimal():
     end_date = '2009-12-31'
     symbols = ['IBM']
     start_val = 10000
-    orders_file = 'trix-orders.csv'
 
     dates = pd.date_range(start_date, end_date)
     prices = get_data(symbols, dates)  # automatically adds SPY
@@ -3,83 +3,11 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 from util import get_data
-import collections
+from order_log import OrderLog
+from indicators import SMA, TRIX
 import numpy as np
 
 
-class EMA(object):
-
-    def __init__(self, periods):
-        self.periods = periods
-        self.history = []
-        self.ema = np.nan
-        self.multiplier = (2.0 / (periods + 1))
-
-    def update(self, value):
-        #print value, self.history, self.ema
-        if value is None or value is np.nan:
-            # invalid value
-            pass
-        elif self.ema is not np.nan:
-            # update ema
-            self.ema += (value - self.ema) * self.multiplier
-        elif len(self.history) < self.periods - 1:
-            # not enough data yet
-            self.history.append(value)
-        elif len(self.history) == self.periods - 1:
-            # set ema to sma
-            self.history.append(value)
-            self.ema = np.mean(self.history)
-        return self.ema
-
-    @property
-    def value(self):
-        return self.ema
-
-
-class ROC(object):
-
-    def __init__(self, periods):
-        self.history = collections.deque([], periods + 1)
-        self.value = np.nan
-
-    def update(self, value):
-        if value and value is not np.nan:
-            self.history.append(value)
-            self.value = (self.history[-1] / self.history[0]) - 1
-        return self.value
-
-
-class SMA(object):
-
-    def __init__(self, periods):
-        self.history = collections.deque([], periods + 1)
-        self.value = np.nan
-
-    def update(self, value):
-        if value and value is not np.nan:
-            self.history.append(value)
-        if len(self.history) == self.history.maxlen:
-            self.value = np.mean(self.history)
-        return self.value
-
-
-class EMAROC(object):
-
-    def __init__(self, ema_factor=1, ema_period=15, roc_period=1):
-        self.ema_list = [EMA(ema_period) for _ in range(ema_factor)]
-        self.roc = ROC(roc_period)
-
-    def update(self, value):
-        for ema in self.ema_list:
-            value = ema.update(value)
-        return self.roc.update(value)
-
-    @property
-    def value(self):
-        return self.roc.value
-
-
 class TRIXTradingEngine(object):
     '''Trade recommendation engine based on TRIX bands.'''
 
@@ -91,12 +19,11 @@ class TRIXTradingEngine(object):
         self.current_position = 0
         self.history = pd.DataFrame(
             columns=[self.symbol, 'TRIX', 'EMA(9)'])
-        self.trix = EMAROC(smoothing, period, 1)
+        self.trix = TRIX(period, smoothing, 1)
         self.signal = SMA(signal)
         self.last_trix = self.trix.value
         self.last_signal = self.signal.value
-        self.recommendation_history = pd.DataFrame(
-            columns=['Symbol', 'Order', 'Shares'])
+        self.recommendation_history = OrderLog()
 
     def add_data_point(self, date, price):
         self.last_trix = self.trix.value
@@ -119,14 +46,8 @@ class TRIXTradingEngine(object):
         def buy():
             amount = self.long_limit - self.current_position
             self.current_position = self.long_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'BUY', amount]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'BUY', amount)
 
         def can_sell():
             return self.current_position > self.short_limit
@@ -134,17 +55,11 @@ class TRIXTradingEngine(object):
         def sell():
             amount = self.current_position - self.short_limit
             self.current_position = self.short_limit
-            recommendation = pd.DataFrame(
-                [[self.symbol, 'SELL', amount]],
-                columns=['Symbol', 'Order', 'Shares'],
-                index=[current_date]
-            )
-            self.recommendation_history = self.recommendation_history.append(
-                recommendation)
-            return recommendation
+            return self.recommendation_history.add(
+                current_date, self.symbol, 'SELL', amount)
 
         def not_enough_data():
-            return self.trix.value is np.nan
+            return np.isnan(self.trix.value)
 
         def is_rising():
             #return self.trix.value > 0 and self.last_trix <= 0
@@ -183,16 +98,19 @@ class TRIXTradingEngine(object):
         df.plot(ax=ax2)
         ax1.set_xlabel("Date")
         ax1.set_ylabel("Price")
-        for date, recommendation in self.recommendation_history.iterrows():
-            color = 'g' if recommendation.ix['Order'] == 'BUY' else 'r'
+        for date, symbol, order, shares in self.recommendation_history:
+            color = 'g' if order == 'BUY' else 'r'
             ax1.axvline(x=date, color=color)
             ax2.axvline(x=date, color=color)
         ax1.legend(loc=3)
         plt.show()
 
+    def get_order_book(self):
+        '''Return recommended orders as an orders dataframe for compute_portvals.'''
+        return self.recommendation_history.to_frame()
+
     def create_order_book(self, path):
-        self.recommendation_history.to_csv(
-            path, columns=['Symbol', 'Order', 'Shares'], index_label='Date')
+        self.recommendation_history.to_frame().to_csv(path, index_label='Date')
 
 
 def run_TRIX(debug=False):
@@ -220,7 +138,7 @@ def run_TRIX(debug=False):
 
 
 def test():
-    d = EMAROC(1, 5, 1)
+    d = TRIX(5, 1, 1)
     for i in range(20):
         print d.update(i)
 
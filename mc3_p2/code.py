@@ -60,6 +60,10 @@ def get_volatility(price):
     return pd.rolling_std(price, 20)
 
 
+def get_volume_ratio(volume, n=20):
+    return volume / pd.rolling_mean(volume, n)
+
+
 def get_price_change(price, n=5):
     return (price.shift(-n) / price) - 1
 
@@ -109,18 +113,23 @@ def parse_args():
                         help='Start Date of test')
     parser.add_argument('-E', '--end-test', dest='end_test',
                         help='End Date of test')
+    parser.add_argument('-V', '--volume', default=False, action='store_true',
+                        help='add volume ratio feature.')
     return parser.parse_args()
 
 
-def get_learning_data(start_date, end_date, symbol):
+def get_learning_data(start_date, end_date, symbol, volume=False):
     dates = pd.date_range(start_date, end_date)
-    prices = get_data([symbol], dates)
-    prices.drop('SPY', axis=1, inplace=True)
+    fields = ['Adj Close', 'Volume'] if volume else ['Adj Close']
+    data = get_data([symbol], dates, fields=fields)
+    prices = data['Adj Close'].drop('SPY', axis=1)
 
     x_df = pd.DataFrame(index=prices.index)
     x_df['bb'] = get_bb_value(prices)
     x_df['momentum'] = get_momentum(prices)
     x_df['volatility'] = get_volatility(prices)
+    if volume:
+        x_df['volume'] = get_volume_ratio(data['Volume'][symbol])
     x_df = normalize(x_df)
     y_values = get_price_change(prices, 5)
 
@@ -201,7 +210,8 @@ if __name__ == '__main__':
     args = parse_args()
     prices, trainX, trainY, indices = get_learning_data(args.start_date,
                                                         args.end_date,
-                                                        args.symbol)
+                                                        args.symbol,
+                                                        args.volume)
 
     # create a learner and train it
     learner = setup_learner(args)
@@ -228,7 +238,8 @@ if __name__ == '__main__':
         # evaluate out sample
         prices, testX, testY, indices = get_learning_data(args.start_test,
                                                           args.end_test,
-                                                          args.symbol)
+                                                          args.symbol,
+                                                          args.volume)
         predY = learner.query(testX)  # get the predictions
         rmse = get_rmse(testY, predY)
         corr = get_correlation(testY, predY)
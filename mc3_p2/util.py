@@ -1,29 +1,409 @@
 """MLT: Utility code."""
 
 import os
+import glob
+import argparse
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
-def symbol_to_path(symbol, base_dir=os.path.join("..", "data")):
+DATA_DIR = os.path.join("..", "data")
+STORE_DIR = "store"
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Adj Close']
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+def symbol_to_path(symbol, base_dir=DATA_DIR):
     """Return CSV file path given ticker symbol."""
     return os.path.join(base_dir, "{}.csv".format(str(symbol)))
 
 
-def get_data(symbols, dates, addSPY=True):
-    """Read stock data (adjusted close) for given symbols from CSV files."""
-    df = pd.DataFrame(index=dates)
+def store_to_path(name, base_dir=DATA_DIR):
+    """Return binary store path for the date axis, symbol list or a field matrix."""
+    return os.path.join(base_dir, STORE_DIR, "{}.npy".format(str(name)))
+
+
+@contextmanager
+def replacing(path):
+    """Yield a temporary path to write, then rename it over path.
+
+    The rename is atomic, so processes that mapped the old file keep
+    reading it intact and new readers never see a half-written file.
+    """
+    fd, tmp = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        yield tmp
+        os.rename(tmp, path)
+    except:
+        os.remove(tmp)
+        raise
+
+
+def read_csv_columns(symbol, colnames=('Adj Close',), base_dir=DATA_DIR):
+    """Read columns of a symbol's CSV file in one pass as date indexed series."""
+    df_temp = pd.read_csv(symbol_to_path(symbol, base_dir), index_col='Date',
+            parse_dates=True, usecols=['Date'] + list(colnames), na_values=['nan'])
+    df_temp = df_temp.sort_index()
+    return [df_temp[colname] for colname in colnames]
+
+
+class PriceStore(object):
+    '''Memory-mapped date x symbol matrices written by ingest().
+
+    Each field is one Fortran ordered matrix, so every symbol column is
+    contiguous on disk. Matrices are mapped copy-on-write: processes reading
+    the same store share one page-cached copy, and every matrix() call is a
+    separate mapping, so a frame built on one can be written to without
+    touching the file or any other frame.
+    '''
+
+    HEADER_READERS = {(1, 0): np.lib.format.read_array_header_1_0,
+                      (2, 0): np.lib.format.read_array_header_2_0}
+
+    def __init__(self, base_dir=DATA_DIR):
+        self.base_dir = base_dir
+        self.dates = pd.DatetimeIndex(np.load(store_to_path('dates', base_dir)))
+        self.symbols = list(np.load(store_to_path('symbols', base_dir)))
+        self.columns = dict((s, i) for i, s in enumerate(self.symbols))
+        self.files = {}
+
+    def matrix(self, field='Adj Close'):
+        '''Return a new copy-on-write mapping of the matrix for field.
+
+        The file is opened once, so the store keeps reading the matrix that
+        matches its axes even after a later ingest replaces the file.
+        '''
+        if field not in self.files:
+            f = open(store_to_path(field, self.base_dir), 'rb')
+            version = np.lib.format.read_magic(f)
+            shape, fortran_order, dtype = self.HEADER_READERS[version](f)
+            self.files[field] = (f, f.tell(), shape, 'F' if fortran_order else 'C', dtype)
+        f, offset, shape, order, dtype = self.files[field]
+        return np.memmap(f, dtype=dtype, mode='c', offset=offset, shape=shape,
+                         order=order)
+
+    def is_fresh(self, symbol, field='Adj Close'):
+        '''Check symbol field was ingested and its CSV has not changed since.'''
+        path = store_to_path(field, self.base_dir)
+        if symbol not in self.columns or not os.path.exists(path):
+            return False
+        csv_path = symbol_to_path(symbol, self.base_dir)
+        return not (os.path.exists(csv_path) and
+                    os.path.getmtime(csv_path) > os.path.getmtime(path))
+
+    def get_column(self, symbol, field='Adj Close'):
+        '''Return the full history of one symbol field as a series.'''
+        values = self.matrix(field)[:, self.columns[symbol]]
+        return pd.Series(values, index=self.dates, name=field).dropna()
+
+    def get_frame(self, symbols, index, field='Adj Close'):
+        '''Return a frame of symbols on index, viewing the mapped matrix if possible.
+
+        The index resolves to a row slice of the matrix and evenly spaced,
+        ascending symbols to a strided column slice. SPY is stored first,
+        so SPY plus any one symbol (the default get_data call) is always a
+        view. Other symbol lists, or dates in the range that the index
+        leaves out, copy only the requested cells.
+        '''
+        if not len(index):
+            return pd.DataFrame(np.empty((0, len(symbols))), index=index,
+                                columns=symbols)
+        start = self.dates.searchsorted(index[0], side='left')
+        stop = self.dates.searchsorted(index[-1], side='right')
+        cols = [self.columns[s] for s in symbols]
+        step = cols[1] - cols[0] if len(cols) > 1 else 1
+        if step > 0 and cols == range(cols[0], cols[-1] + 1, step):
+            values = self.matrix(field)[start:stop, cols[0]:cols[-1] + 1:step]
+        else:
+            values = self.matrix(field)[start:stop].take(cols, axis=1)
+        df = pd.DataFrame(values, index=self.dates[start:stop],
+                          columns=symbols, copy=False)
+        if stop - start != len(index) or not df.index.equals(index):
+            df = df.reindex(index)
+        return df
+
+
+class TradingCalendar(object):
+    '''Sorted index of SPY trading days with O(log n) date to row lookups.'''
+
+    def __init__(self, dates):
+        self.dates = pd.DatetimeIndex(dates)
+
+    def locate(self, start_date, end_date):
+        '''Return the [start, stop) row slice of trading days in a date range.'''
+        start = self.dates.searchsorted(pd.Timestamp(start_date), side='left')
+        stop = self.dates.searchsorted(pd.Timestamp(end_date), side='right')
+        return start, stop
+
+    def between(self, start_date, end_date):
+        '''Return trading days from start_date to end_date (inclusive).'''
+        start, stop = self.locate(start_date, end_date)
+        return self.dates[start:stop]
+
+    def index(self, dates):
+        '''Return the trading days among dates.'''
+        dates = pd.DatetimeIndex(dates)
+        if not len(dates):
+            return self.dates[:0]
+        index = self.between(dates[0], dates[-1])
+        if dates.freqstr != 'D' and not index.equals(dates):
+            index = index[index.isin(dates)]
+        return index
+
+    def offsets(self, dates):
+        '''Return calendar row offsets of dates, -1 for non-trading days.'''
+        dates = pd.DatetimeIndex(dates)
+        rows = self.dates.searchsorted(dates)
+        found = rows < len(self.dates)
+        found[found] = self.dates[rows[found]] == dates[found]
+        return np.where(found, rows, -1)
+
+
+_stores = {}
+
+
+def open_store(base_dir=DATA_DIR):
+    """Return the process-wide PriceStore for base_dir, or None if not ingested."""
+    path = store_to_path('dates', base_dir)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if base_dir not in _stores or _stores[base_dir][0] != mtime:
+        _stores[base_dir] = (mtime, PriceStore(base_dir))
+    return _stores[base_dir][1]
+
+
+class SeriesCache(object):
+    '''Thread-safe LRU cache of full-history series with a byte budget.'''
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        '''Return cached series for key, marking it most recently used.'''
+        with self.lock:
+            series = self.entries.pop(key, None)
+            if series is not None:
+                self.entries[key] = series
+            return series
+
+    def put(self, key, series):
+        '''Cache series under key, evicting least recently used entries.'''
+        size = self._size(series)
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self._size(self.entries.pop(key))
+            if size > self.max_bytes:
+                return
+            self.entries[key] = series
+            self.nbytes += size
+            self._evict()
+
+    def resize(self, max_bytes):
+        '''Change the byte budget, evicting entries that no longer fit.'''
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes:
+            _, series = self.entries.popitem(last=False)
+            self.nbytes -= self._size(series)
+
+    @staticmethod
+    def _size(series):
+        return series.values.nbytes + series.index.nbytes
+
+
+price_cache = SeriesCache()
+
+
+def read_fields(symbol, fields=('Adj Close',), base_dir=DATA_DIR):
+    """Read full history of several fields of a symbol.
+
+    Fields are served from the process-wide price cache if possible. Missing
+    fields are loaded together from the binary store or in a single pass
+    over the CSV file, and cached for the next caller.
+    """
+    columns = [price_cache.get((base_dir, symbol, f)) for f in fields]
+    missing = [f for f, c in zip(fields, columns) if c is None]
+    if missing:
+        store = open_store(base_dir)
+        if store is not None and all(store.is_fresh(symbol, f) for f in missing):
+            loaded = [store.get_column(symbol, f) for f in missing]
+        else:
+            loaded = read_csv_columns(symbol, missing, base_dir)
+        loaded = dict(zip(missing, loaded))
+        for field, series in loaded.items():
+            price_cache.put((base_dir, symbol, field), series)
+        columns = [loaded[f] if c is None else c for f, c in zip(fields, columns)]
+    return columns
+
+
+def read_symbols(symbols, fields=('Adj Close',), base_dir=DATA_DIR, threads=8):
+    """Read fields for many symbols concurrently with a bounded thread pool."""
+    if len(symbols) < 2:
+        return [read_fields(s, fields, base_dir) for s in symbols]
+    pool = ThreadPool(min(threads, len(symbols)))
+    try:
+        return pool.map(lambda s: read_fields(s, fields, base_dir), symbols)
+    finally:
+        pool.close()
+
+
+_calendars = {}
+
+
+def get_calendar(base_dir=DATA_DIR):
+    """Return the process-wide TradingCalendar derived from SPY.
+
+    The calendar is persisted in the store directory and only rebuilt from
+    SPY when the SPY CSV file is newer than the persisted copy.
+    """
+    path = store_to_path('calendar', base_dir)
+    mtime = os.path.getmtime(symbol_to_path('SPY', base_dir))
+    if base_dir in _calendars and _calendars[base_dir][0] == mtime:
+        return _calendars[base_dir][1]
+    if os.path.exists(path) and os.path.getmtime(path) >= mtime:
+        dates = np.load(path)
+    else:
+        dates = read_csv_columns('SPY', base_dir=base_dir)[0].dropna().index.values
+        save_calendar(dates, base_dir)
+    _calendars[base_dir] = (mtime, TradingCalendar(dates))
+    return _calendars[base_dir][1]
+
+
+def save_calendar(dates, base_dir=DATA_DIR):
+    """Persist trading days to the store directory, if it is writable."""
+    store_dir = os.path.join(base_dir, STORE_DIR)
+    try:
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        with replacing(store_to_path('calendar', base_dir)) as path:
+            np.save(path, dates)
+    except (IOError, OSError):
+        pass  # read-only data directory, rebuild from SPY next time
+
+
+def ingest(base_dir=DATA_DIR, fields=FIELDS, dtype=np.float64):
+    """Convert the CSV directory into a binary, memory-mappable store.
+
+    Every field is written as one date x symbol matrix aligned to a single
+    shared date axis (the union of all dates found in the CSV files).
+    Fields stored by an earlier ingest but not listed in fields are removed.
+
+    Parameters
+    ----------
+        base_dir: directory containing <SYMBOL>.csv files
+        fields: CSV columns to ingest
+        dtype: float type of the stored matrices (float32 halves the size)
+
+    Returns
+    -------
+        symbols: list of ingested symbols
+    """
+    frames = {}
+    for path in sorted(glob.glob(os.path.join(base_dir, '*.csv'))):
+        symbol = os.path.splitext(os.path.basename(path))[0]
+        df = pd.read_csv(path, index_col='Date', parse_dates=True,
+                         usecols=['Date'] + list(fields), na_values=['nan'])
+        frames[symbol] = df.sort_index()
+    # SPY first, as get_data asks for it first, so SPY plus one symbol is a view
+    symbols = sorted(frames.keys(), key=lambda s: (s != 'SPY', s))
+    # The calendar always comes from SPY's Adj Close, whichever fields are ingested
+    if 'SPY' in frames and 'Adj Close' in fields:
+        calendar = frames['SPY']['Adj Close'].dropna().index.values
+    elif 'SPY' in frames:
+        calendar = read_csv_columns('SPY', base_dir=base_dir)[0].dropna().index.values
+
+    dates = pd.DatetimeIndex([])
+    for df in frames.values():
+        dates = dates.union(df.index)
+    store_dir = os.path.join(base_dir, STORE_DIR)
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+
+    # Files are replaced, never rewritten in place, under running readers
+    for field in fields:
+        with replacing(store_to_path(field, base_dir)) as path:
+            matrix = np.lib.format.open_memmap(
+                path, mode='w+', dtype=dtype,
+                shape=(len(dates), len(symbols)), fortran_order=True)
+            for i, symbol in enumerate(symbols):
+                matrix[:, i] = frames[symbol][field].reindex(dates).values
+            matrix.flush()
+            del matrix
+    # Fields left out were laid out for the old axes, so they go
+    for field in set(FIELDS) - set(fields):
+        if os.path.exists(store_to_path(field, base_dir)):
+            os.remove(store_to_path(field, base_dir))
+    if 'SPY' in frames:
+        save_calendar(calendar, base_dir)
+    # Axes written last, open_store() reloads whenever the date axis changes
+    with replacing(store_to_path('symbols', base_dir)) as path:
+        np.save(path, np.array(symbols))
+    with replacing(store_to_path('dates', base_dir)) as path:
+        np.save(path, dates.values)
+    return symbols
+
+
+def align_columns(columns, symbols, fields, index):
+    """Slice full-history columns to index and concat them into one frame.
+
+    columns holds one list of field series per symbol. The frame has
+    (field, symbol) columns.
+    """
+    keys = [(f, s) for f in fields for s in symbols]
+    if not len(index):  # no trading days in range
+        return pd.DataFrame(np.empty((0, len(keys))), index=index,
+                            columns=pd.MultiIndex.from_tuples(keys))
+    start, end = index[0], index[-1]
+    return pd.concat(
+        [columns[i][j][start:end].reindex(index)
+         for j in range(len(fields)) for i in range(len(symbols))],
+        axis=1, keys=keys)
+
+
+def get_data(symbols, dates, addSPY=True, base_dir=DATA_DIR, fields='Adj Close'):
+    """Read stock data for given symbols from the cache, binary store or CSV files.
+
+    A single field (default: adjusted close) gives one column per symbol. A
+    list of fields gives (field, symbol) MultiIndex columns, so that
+    df['Volume'] is a date x symbol frame. Each file is read at most once.
+    """
+    multi = not isinstance(fields, basestring)
+    fields = list(fields) if multi else [fields]
     if addSPY and 'SPY' not in symbols:  # add SPY for reference, if absent
         symbols = ['SPY'] + symbols
+    index = pd.DatetimeIndex(dates)
+    if 'SPY' in symbols:  # drop dates SPY did not trade
+        index = get_calendar(base_dir).index(index)
 
-    for symbol in symbols:
-        df_temp = pd.read_csv(symbol_to_path(symbol), index_col='Date',
-                parse_dates=True, usecols=['Date', 'Adj Close'], na_values=['nan'])
-        df_temp = df_temp.rename(columns={'Adj Close': symbol})
-        df = df.join(df_temp)
-        if symbol == 'SPY':  # drop dates SPY did not trade
-            df = df.dropna(subset=["SPY"])
-
-    return df
+    columns = [[price_cache.get((base_dir, s, f)) for f in fields]
+               for s in symbols]
+    if any(c is None for row in columns for c in row):
+        store = open_store(base_dir)
+        if store is not None and all(
+                store.is_fresh(s, f) for s in symbols for f in fields):
+            frames = [store.get_frame(symbols, index, f) for f in fields]
+            return pd.concat(frames, axis=1, keys=fields) if multi else frames[0]
+        columns = read_symbols(symbols, fields, base_dir)
+    df = align_columns(columns, symbols, fields, index)
+    return df if multi else df[fields[0]]
 
 
 def plot_data(df, title="Stock prices", xlabel="Date", ylabel="Price"):
@@ -32,3 +412,23 @@ def plot_data(df, title="Stock prices", xlabel="Date", ylabel="Price"):
     ax.set_xlabel(xlabel)
     ax.set_ylabel(ylabel)
     plt.show()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Ingest CSV price files into the binary store')
+    parser.add_argument('-d', '--data-dir', dest='data_dir', default=DATA_DIR,
+                        help='directory containing <SYMBOL>.csv files')
+    parser.add_argument('-f', '--fields', nargs='+', default=FIELDS,
+                        help='CSV columns to ingest')
+    parser.add_argument('--float32', default=False, action='store_true',
+                        help='store matrices as float32 instead of float64')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    dtype = np.float32 if args.float32 else np.float64
+    symbols = ingest(args.data_dir, args.fields, dtype)
+    print "Ingested {} symbols into {}".format(
+        len(symbols), os.path.join(args.data_dir, STORE_DIR))